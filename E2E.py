@@ -74,11 +74,15 @@ class TestFactory:
 
         self.options_not_covered = [
             'Lookup users',
+            'People you may know',
             'Exit',
             'Create/view/edit profile',
             'See job titles and apply',
             'Mark a job',
             'Delete a job',
+            'Stats of my job postings',
+            'See applicants to my job postings',
+            'Recommended jobs',
             'General',
             'Browse InCollege',
             'Business Solutions',
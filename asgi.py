@@ -0,0 +1,173 @@
+import os
+import asyncio
+from io import BytesIO
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import jwt
+from asgiref.wsgi import WsgiToAsgiInstance
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import server
+import statements
+import caches
+import tracing
+from request_handlers import application_list, unread_message_counts
+
+# ASGI deployment mode, served with e.g. `DB_PATH=users.db uvicorn asgi:app --workers 4`.
+# The per-user read-only GET routes are served by native async handlers over aiosqlite, so a
+# request waiting on the database doesn't hold a worker. They execute the statements of
+# statements.py and read the profile and preferences caches like the Flask handlers do, and echo
+# X-Request-ID. Every other route is passed to the Flask app from server.py, run in a thread pool
+# of WSGI_THREADS threads (default 16). That includes /job-postings, served from its snapshot with
+# an ETag, and /list-users.
+
+engine = create_async_engine(f'sqlite+aiosqlite:///{server.db_path}')
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('WSGI_THREADS', 16)))
+routes = {}
+
+def route(path):
+    def decorator(handler):
+        routes[('GET', path)] = handler
+        return handler
+    return decorator
+
+async def authenticate(connection, headers):
+    # returns (user id, generation) like server.authenticate, or None
+    try:
+        token = headers[b'authorization'].decode('latin1').strip().split(' ')[1]
+        payload = jwt.decode(token, Path('./jwt-key.txt').read_text().strip(), algorithms=['HS256'])
+        user_id = payload['user_id']
+    except (KeyError, IndexError, jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
+        return None
+
+    user = (await connection.execute(statements.AUTHENTICATE, { 'user_id': user_id })).one_or_none()
+    if user is None:
+        return None
+
+    return user_id, user.generation
+
+async def all_rows(connection, statement, user_id):
+    return [row._asdict() for row in await connection.execute(statement, { 'user_id': user_id })]
+
+async def read_through(cache, connection, statement, user_id, generation):
+    # caches.read_through over the async connection, sharing its entries with the Flask handlers
+    value = cache.get(user_id, generation)
+    if value is not None:
+        return value
+
+    row = (await connection.execute(statement, { 'user_id': user_id })).one_or_none()
+    if row is None:
+        return None
+
+    value = row._asdict()
+    cache.put(user_id, value, generation)
+    return value
+
+@route('/profile')
+async def get_profile(connection, user_id, generation):
+    profile = await read_through(caches.profiles, connection, statements.PROFILE, user_id, generation)
+
+    if profile is None:
+        return {'error': 'Profile not found'}, 404
+    return profile
+
+@route('/job-history')
+async def get_job_history(connection, user_id, generation):
+    return await all_rows(connection, statements.JOB_HISTORY, user_id)
+
+@route('/pending-requests')
+async def pending_requests(connection, user_id, generation):
+    return await all_rows(connection, statements.PENDING_REQUESTS, user_id)
+
+@route('/connections')
+async def connections(connection, user_id, generation):
+    return await all_rows(connection, statements.CONNECTIONS, user_id)
+
+@route('/jobs-posted')
+async def get_jobs_posted(connection, user_id, generation):
+    return await all_rows(connection, statements.JOBS_POSTED, user_id)
+
+@route('/user-preferences')
+async def get_user_preferences(connection, user_id, generation):
+    preferences = await read_through(caches.preferences, connection, statements.PREFERENCES, user_id, generation)
+
+    if preferences is None:
+        return {'error': 'Preferences not found'}, 404
+    return preferences
+
+@route('/applications')
+async def applications(connection, user_id, generation):
+    return application_list(await connection.execute(statements.APPLICATIONS, { 'user_id': user_id }))
+
+@route('/marked')
+async def marked(connection, user_id, generation):
+    return (await connection.execute(statements.MARKED_JOB_IDS, { 'user_id': user_id })).scalars().all()
+
+@route('/unread-messages')
+async def unread_messages(connection, user_id, generation):
+    return unread_message_counts(await connection.execute(statements.UNREAD_MESSAGES, { 'user_id': user_id }))
+
+async def handle(handler, scope):
+    headers = dict(scope['headers'])
+    request_id = headers.get(tracing.REQUEST_ID_HEADER.lower().encode(), b'').decode('latin1')
+    request_id = request_id if tracing.REQUEST_ID.fullmatch(request_id) else tracing.new_request_id()
+    id_header = (tracing.REQUEST_ID_HEADER.lower().encode(), request_id.encode())
+
+    async with engine.connect() as connection:
+        user = await authenticate(connection, headers)
+        if user is None:
+            return 401, [(b'content-type', b'text/html; charset=utf-8'), id_header], b'Unauthorized'
+
+        result = await handler(connection, *user)
+
+    payload, status = result if isinstance(result, tuple) else (result, 200)
+    return status, [(b'content-type', b'application/json'), id_header], (server.app.json.dumps(payload) + '\n').encode()
+
+def run_wsgi(scope, body):
+    # asgiref's WsgiToAsgi runs every request on one shared thread, so only its environ builder is reused
+    instance = WsgiToAsgiInstance(server.app)
+    instance.scope = scope
+    response = {}
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+    output = server.app(instance.build_environ(scope, body), start_response)
+    try:
+        content = b''.join(output)
+    finally:
+        if hasattr(output, 'close'):
+            output.close()
+    return response['status'], response['headers'], content
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            executor.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+
+    handler = routes.get((scope['method'], scope['path']))
+    if handler is not None:
+        status, headers, content = await handle(handler, scope)
+    else:
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(executor, run_wsgi, scope, BytesIO(body))
+
+    headers = [(name, value) for name, value in headers if name != b'content-length'] + [(b'content-length', str(len(content)).encode())]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': content})
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+import workload
+
+# Measures throughput and latency percentiles of every route in-process through the Flask test
+# client, against a database seeded by workload.py. Results are written as JSON so that runs can
+# be compared:
+#   python3 benchmark.py --users 10000 --output before.json
+#   python3 benchmark.py --users 10000 --output after.json --compare before.json
+
+def parse():
+    parser = argparse.ArgumentParser(description='Endpoint benchmark')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users to seed (default: 1000)')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route (default: 200)')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route (default: 20)')
+    parser.add_argument('--routes', type=str, nargs='*', default=None, help='Only benchmark these paths, e.g. /profile /connections')
+    parser.add_argument('--db', type=str, default=None, help='Path of the database to create (default: a temporary file)')
+    parser.add_argument('--output', type=str, default='benchmark.json', help='Where to write the results (default: benchmark.json)')
+    parser.add_argument('--compare', type=str, default=None, help='Results of an earlier run to compare requests per CPU second against')
+
+    return parser.parse_args()
+
+def percentile(sorted_samples, p):
+    index = min(len(sorted_samples) - 1, max(0, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def run(client, method, path, body, headers, i):
+    if method == 'GET':
+        return client.get(path, headers=headers)
+    return client.post(path, data=json.dumps(body(i)), content_type='application/json', headers=headers)
+
+def benchmark(server, num_users, num_jobs, num_requests, num_warmup, paths=None):
+    client = server.app.test_client()
+    results = {}
+    for endpoint, method, path, body, user in workload.scenarios(num_users, num_jobs):
+        if paths is not None and path not in paths:
+            continue
+
+        headers = {} if user is None else workload.auth_header(user + 1, f'user{user}')
+        for i in range(num_warmup):
+            run(client, method, path, body, headers, i)
+            workload.undo(client, endpoint, headers, i)
+
+        latencies, statuses = [], {}
+        elapsed, cpu_elapsed = 0, 0       # of the measured requests only, not of the undo requests
+        for i in range(num_warmup, num_warmup + num_requests):
+            request_start, cpu_start = time.perf_counter(), time.process_time()
+            response = run(client, method, path, body, headers, i)
+            latencies.append(time.perf_counter() - request_start)
+            elapsed, cpu_elapsed = elapsed + latencies[-1], cpu_elapsed + time.process_time() - cpu_start
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            workload.undo(client, endpoint, headers, i)
+
+        latencies.sort()
+        results[endpoint] = {
+            'path': path,
+            'requests': num_requests,
+            'statuses': { str(status): count for status, count in statuses.items() },
+            'requests_per_second': num_requests / elapsed,
+            'requests_per_cpu_second': num_requests / cpu_elapsed if cpu_elapsed > 0 else None,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': latencies[-1] * 1000
+        }
+
+    return results
+
+def compare(results, baseline):
+    # requests per CPU second is less sensitive to other load on the machine than requests per second
+    print(f'{"route":<28}{"before":>12}{"after":>12}{"change":>10}   (requests per CPU second)')
+    for endpoint, result in results.items():
+        before = baseline['routes'].get(endpoint, {}).get('requests_per_cpu_second')
+        after = result['requests_per_cpu_second']
+        if before is None or after is None:
+            continue
+        print(f'{result["path"]:<28}{before:>12.1f}{after:>12.1f}{(after / before - 1) * 100:>+9.1f}%')
+
+if __name__ == '__main__':
+    args = parse()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    num_users, num_jobs = workload.seed(db_path, args.users)
+    server = workload.load_app(db_path)
+    results = benchmark(server, num_users, num_jobs, args.requests, args.warmup, args.routes)
+
+    print(f'{"route":<28}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}  statuses')
+    for endpoint, result in results.items():
+        print(f'{result["path"]:<28}{result["requests_per_second"]:>10.1f}{result["p50_ms"]:>10.2f}'
+            f'{result["p95_ms"]:>10.2f}{result["p99_ms"]:>10.2f}  {result["statuses"]}')
+
+    with open(args.output, 'w') as output_file:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'users': num_users,
+                'jobs': num_jobs,
+                'requests': args.requests,
+                'warmup': args.warmup,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'argv': sys.argv[1:]
+            },
+            'routes': results
+        }, output_file, indent=4)
+    print(f'\nResults written to {args.output}')
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            print()
+            compare(results, json.load(baseline_file))
+
+    failed = [result['path'] for result in results.values() if workload.unexpected_statuses(int(status) for status in result['statuses'])]
+    if len(failed) > 0:
+        print(f'\nRoutes answering with an unexpected status: {", ".join(failed)}')
+        sys.exit(1)
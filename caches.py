@@ -0,0 +1,349 @@
+import os
+import math
+import time
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+
+import statements
+from shared_cache import SharedCache
+
+# Caches of the request handlers. By default each gunicorn worker has its own copy, so a cache may
+# only hold data that is either immutable or invalidated by a mechanism that reaches every worker.
+# With CACHE_BACKEND=shared the caches made by make_cache are instead shared by all the workers of
+# the host, see shared_cache.py. Hit and miss counters of all caches are served by GET /cache-stats.
+
+BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+assert BACKEND in ['local', 'shared'], f'Invalid CACHE_BACKEND: {BACKEND}'
+
+registry = {}
+
+class LRUCache:
+    '''
+    Thread safe mapping bounded to max_size entries, evicting the least recently used one.
+    get() returns None on a miss, so None can't be cached. Entries expire after ttl seconds if
+    given, and can be stored with a version: get() with a different version is a miss.
+    '''
+
+    def __init__(self, name, max_size, ttl=None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        registry[name] = self
+
+    def get(self, key, version=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] != version or (entry[2] is not None and entry[2] < time.monotonic()):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version=None):
+        with self.lock:
+            self.entries[key] = (value, version, None if self.ttl is None else time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def put_many(self, items, version=None):
+        for key, value in items:
+            self.put(key, value, version)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'local',
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses > 0 else None
+            }
+
+def make_cache(name, max_size, ttl=None):
+    if BACKEND == 'shared':
+        registry[name] = SharedCache(name, max_size, ttl, path=os.environ.get('CACHE_PATH'),
+            max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+        return registry[name]
+    return LRUCache(name, max_size, ttl)
+
+class Snapshot:
+    '''
+    A single value, e.g. a serialized response, rebuilt as a whole when it has been invalidated or
+    is older than ttl seconds. Concurrent misses wait for the one rebuild in progress instead of
+    each running their own (single flight).
+    '''
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self.entry = None           # (value, built_at)
+        self.invalidations = 0
+        self.lock = Lock()          # guards entry and invalidations
+        self.build_lock = Lock()    # held by the thread rebuilding the value
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        registry[name] = self
+
+    def current(self):
+        with self.lock:
+            if self.entry is None or (self.ttl is not None and self.entry[1] + self.ttl < time.monotonic()):
+                return None, self.invalidations
+            return self.entry[0], self.invalidations
+
+    def get(self, build):
+        value, _ = self.current()
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        with self.build_lock:
+            value, invalidations = self.current()
+            if value is not None:
+                return value        # rebuilt by another thread while this one waited
+
+            value = build()
+            self.builds += 1
+            with self.lock:
+                # an invalidation during the build means it may have read data that was about to change
+                if invalidations == self.invalidations:
+                    self.entry = (value, time.monotonic())
+            return value
+
+    def invalidate(self):
+        # to be called after the commit of the change, so a concurrent rebuild can't store the old data
+        with self.lock:
+            self.entry = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'built': self.entry is not None,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'builds': self.builds,
+                'invalidations': self.invalidations
+            }
+
+# username -> (id, tier). Neither changes once an account exists and accounts can't be deleted, so
+# entries never go stale. Unknown usernames aren't cached since they may sign up at any moment, in
+# any worker.
+usernames = make_cache('usernames', int(os.environ.get('USERNAME_CACHE_SIZE', 100000)))
+
+def resolve_username(session, username):
+    '''
+    Returns (id, tier) of the user with that username, or None if there is none.
+    '''
+
+    entry = usernames.get(username)
+    if entry is not None:
+        return tuple(entry)     # a list when read from the shared cache
+
+    user = session.connection().execute(statements.USER_BY_USERNAME, { 'username': username }).one_or_none()
+    if user is None:
+        return None
+
+    usernames.put(username, (user.id, user.tier))
+    return user.id, user.tier
+
+def warm_usernames(connection):
+    users = connection.execute(statements.ALL_USERNAMES.limit(usernames.max_size))
+    usernames.put_many((user.username, (user.id, user.tier)) for user in users)
+
+# user id -> profile and user id -> preferences, as served by /profile and /user-preferences. Entries
+# are versioned with the user's generation, which authenticate() reads on every request, so a
+# change made through another worker is seen on the next request. The TTL bounds how long entries
+# of users that stopped making requests are kept.
+profiles = make_cache('profiles', int(os.environ.get('PROFILE_CACHE_SIZE', 10000)), ttl=float(os.environ.get('PROFILE_CACHE_TTL', 300)))
+preferences = make_cache('preferences', int(os.environ.get('PROFILE_CACHE_SIZE', 10000)), ttl=float(os.environ.get('PROFILE_CACHE_TTL', 300)))
+
+# Invalidation across workers: a handler that changes a table whose data is cached calls
+# table_changed() in its transaction, which increments the table's row in the generations table,
+# and invalidate_table() after committing to drop the caches of its own worker. Handlers that read
+# such a cache call check_generations() first, which compares the generations with the ones seen
+# last and drops the caches of the tables that changed. It queries the database at most once every
+# GENERATION_CHECK_INTERVAL seconds (default 0.5) per worker, which bounds how stale a cache can be.
+
+GENERATION_CHECK_INTERVAL = float(os.environ.get('GENERATION_CHECK_INTERVAL', 0.5))
+
+tables = {}         # table name -> functions dropping the caches of its data
+generations = {}    # table name -> generation seen last
+generations_checked_at = None
+generations_lock = Lock()
+
+def on_change(table, invalidate):
+    tables.setdefault(table, []).append(invalidate)
+
+def table_changed(session, table):
+    session.connection().execute(statements.BUMP_TABLE_GENERATION, { 'name': table })
+
+def invalidate_table(table):
+    for invalidate in tables.get(table, []):
+        invalidate()
+
+def check_generations(session):
+    global generations_checked_at
+
+    if generations_checked_at is not None and time.monotonic() < generations_checked_at + GENERATION_CHECK_INTERVAL:
+        return
+
+    with generations_lock:
+        if generations_checked_at is not None and time.monotonic() < generations_checked_at + GENERATION_CHECK_INTERVAL:
+            return      # checked by another thread while this one waited
+        generations_checked_at = time.monotonic()
+        current = dict(session.connection().execute(statements.TABLE_GENERATIONS).all())
+        for table, generation in current.items():
+            if generations.get(table) != generation:
+                invalidate_table(table)
+        generations.update(current)
+
+# The serialized body of /job-postings and its ETag, rebuilt when job_postings changes.
+# JOB_POSTINGS_SNAPSHOT_TTL additionally bounds its age, unlimited by default.
+job_postings = Snapshot('job_postings', ttl=float(os.environ['JOB_POSTINGS_SNAPSHOT_TTL']) if 'JOB_POSTINGS_SNAPSHOT_TTL' in os.environ else None)
+on_change('job_postings', job_postings.invalidate)
+
+class BloomFilter:
+    '''
+    Set membership with no false negatives and about error_rate false positives while it holds at
+    most capacity items. Items are hashed once with BLAKE2 and the bit positions derived from the
+    two halves of the digest (double hashing).
+    '''
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+class UsernameFilter:
+    '''
+    Answers whether a username is available without a query in the common case: usernames that
+    aren't in the Bloom filter are free, the others are confirmed with an indexed lookup. The filter
+    is built from the users table on first use, doubling its capacity whenever it fills up, and
+    extended with the users whose id is above the largest one loaded when the users table changes.
+    '''
+
+    def __init__(self, error_rate):
+        self.error_rate = error_rate
+        self.filter = None
+        self.max_id = 0
+        self.stale = True
+        self.lock = Lock()
+        self.negatives = 0
+        self.confirmed = 0
+        self.false_positives = 0
+        registry['username_filter'] = self
+        on_change('users', self.invalidate)
+
+    def invalidate(self):
+        self.stale = True
+
+    def refresh(self, connection):
+        # available() reads the filter without the lock, so a new filter is only swapped in once it
+        # is fully loaded, and extending the current one only ever adds bits
+        with self.lock:
+            if self.filter is not None and not self.stale:
+                return      # refreshed by another thread while this one waited
+            self.stale = False      # set before loading so a change made meanwhile triggers another refresh
+            if self.filter is None or self.filter.count > self.filter.capacity:
+                capacity = max(1024, 2 * (self.filter.count if self.filter is not None else 0))
+                bloom_filter, max_id = BloomFilter(capacity, self.error_rate), 0
+            else:
+                bloom_filter, max_id = self.filter, self.max_id
+
+            for user in connection.execute(statements.USERNAMES_AFTER, { 'id': max_id }):
+                bloom_filter.add(user.username)
+                max_id = user.id
+
+            self.filter, self.max_id = bloom_filter, max_id
+            if self.filter.count > self.filter.capacity:
+                self.stale = True   # rebuilt at twice the size on the next refresh
+
+    def available(self, session, username):
+        # stale is cleared as the first load starts, until it ends the filter is None
+        if self.stale or self.filter is None:
+            self.refresh(session.connection())
+
+        if username not in self.filter:
+            self.negatives += 1
+            return True
+
+        if resolve_username(session, username) is None:
+            self.false_positives += 1
+            return True
+
+        self.confirmed += 1
+        return False
+
+    def stats(self):
+        return {
+            'size': None if self.filter is None else self.filter.count,
+            'capacity': None if self.filter is None else self.filter.capacity,
+            'bytes': None if self.filter is None else len(self.filter.bits),
+            'negatives': self.negatives,
+            'confirmed': self.confirmed,
+            'false_positives': self.false_positives
+        }
+
+# Usernames are never freed, so add_user is the only change the filter has to follow.
+username_filter = UsernameFilter(float(os.environ.get('USERNAME_FILTER_ERROR_RATE', 0.01)))
+
+def read_through(cache, session, statement, user_id, generation):
+    value = cache.get(user_id, generation)
+    if value is not None:
+        return value
+
+    row = session.connection().execute(statement, { 'user_id': user_id }).one_or_none()
+    if row is None:
+        return None
+
+    value = row._asdict()
+    cache.put(user_id, value, generation)
+    return value
+
+def invalidate_user(session, user_id):
+    '''
+    Called in the transaction that changes a user's profile or preferences. Bumping the generation
+    invalidates the entries of every worker, dropping them here frees them right away.
+    '''
+
+    session.connection().execute(statements.BUMP_GENERATION, { 'user_id': user_id })
+    profiles.invalidate(user_id)
+    preferences.invalidate(user_id)
+
+def stats():
+    return { name: cache.stats() for name, cache in registry.items() }
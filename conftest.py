@@ -0,0 +1,45 @@
+import os
+import json
+import secrets
+import pytest
+import workload
+
+# Fixtures of the test_*.py files, which drive server.py through the Flask test client against a
+# database seeded by workload.seed (see there for who is connected to whom and who posted what).
+# server.py binds to DB_PATH when first imported, so all the tests share one database: each acts
+# on users and jobs of its own, or compares counters before and after, instead of assuming a fresh
+# one. E2E.py covers the CLI against a live server.
+
+NUM_USERS = 60
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    # jwt-key.txt is read from the working directory
+    directory = tmp_path_factory.mktemp('server')
+    (directory / 'jwt-key.txt').write_text(secrets.token_hex(32))
+    cwd = os.getcwd()
+    os.chdir(directory)
+
+    workload.seed(str(directory / 'test.db'), NUM_USERS)
+    yield workload.load_app(str(directory / 'test.db'))
+    os.chdir(cwd)
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+@pytest.fixture
+def post(client):
+    # post(path, body, i) sends body as user i, or unauthenticated if i is None
+    def send(path, body, i=None):
+        headers = workload.auth_header(i + 1, f'user{i}') if i is not None else {}
+        return client.post(path, data=json.dumps(body), content_type='application/json', headers=headers)
+    return send
+
+@pytest.fixture
+def get(client):
+    def send(path, i=None, headers={}):
+        if i is not None:
+            headers = {**headers, **workload.auth_header(i + 1, f'user{i}')}
+        return client.get(path, headers=headers)
+    return send
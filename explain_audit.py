@@ -0,0 +1,133 @@
+import sys
+import os
+import json
+import sqlite3
+import argparse
+import tempfile
+from sqlalchemy import event
+
+import workload
+
+# Runs every route against a seeded database, captures the statements each one emits and runs
+# EXPLAIN QUERY PLAN on them. Findings are keyed by route so that a baseline file can be
+# committed and compared against to catch index regressions:
+#   python3 explain_audit.py --baseline explain-baseline.json
+
+def parse():
+    parser = argparse.ArgumentParser(description='EXPLAIN QUERY PLAN auditor')
+    parser.add_argument('--users', type=int, default=100, help='Number of users to seed (default: 100)')
+    parser.add_argument('--db', type=str, default=None, help='Path of the database to create (default: a temporary file)')
+    parser.add_argument('--report', type=str, default=None, help='Write the full report as JSON to this path')
+    parser.add_argument('--baseline', type=str, default=None, help='Fail if a finding is not listed in this baseline file')
+    parser.add_argument('--write-baseline', action='store_true', help='Write the current findings to --baseline instead of comparing')
+    parser.add_argument('--ignore-non-covering', action='store_true', help='Don\'t report index searches that need a table lookup')
+
+    return parser.parse_args()
+
+def findings(plan, ignore_non_covering=False):
+    # plan rows are (id, parent, notused, detail)
+    for row in plan:
+        detail = row[3]
+        words = detail.split(' ')
+        # SCAN CONSTANT ROW is the single row of a SELECT without FROM, not a table
+        if words[0] == 'SCAN' and len(words) > 1 and detail != 'SCAN CONSTANT ROW':
+            yield ('full-scan', words[1], detail)
+        elif 'TEMP B-TREE' in detail:
+            yield ('temp-b-tree', None, detail)
+        elif 'AUTOMATIC' in detail:
+            yield ('automatic-index', words[1], detail)
+        elif words[0] == 'SEARCH' and 'USING INDEX' in detail and not ignore_non_covering:
+            yield ('non-covering-index', words[1], detail)
+
+def audit(server, num_users, num_jobs, ignore_non_covering=False):
+    captured = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        # the first row of an executemany, the batches of insertmanyvalues come flattened
+        if executemany and len(parameters) > 0 and isinstance(parameters[0], (list, tuple)):
+            parameters = parameters[0]
+        captured.append((statement, tuple(parameters)))
+    event.listen(server.engine, 'before_cursor_execute', capture)
+
+    connection = sqlite3.connect(os.environ['DB_PATH'])
+    client = server.app.test_client()
+    report = {}
+    for endpoint, method, path, body, user in workload.scenarios(num_users, num_jobs):
+        headers = {} if user is None else workload.auth_header(user + 1, f'user{user}')
+        captured.clear()
+        if method == 'GET':
+            response = client.get(path, headers=headers)
+        else:
+            response = client.post(path, data=json.dumps(body(0)), content_type='application/json', headers=headers)
+
+        statements = []
+        for statement, parameters in dict.fromkeys(captured):
+            if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT INTO')) or \
+                    (statement.lstrip().upper().startswith('INSERT') and 'SELECT' not in statement.upper()):
+                continue
+
+            plan = connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+            statements.append({
+                'statement': ' '.join(statement.split()),
+                'plan': [row[3] for row in plan],
+                'findings': [{ 'kind': kind, 'table': table, 'detail': detail }
+                    for kind, table, detail in findings(plan, ignore_non_covering)]
+            })
+
+        report[endpoint] = { 'path': path, 'status': response.status_code, 'statements': statements }
+        workload.undo(client, endpoint, headers, 0)
+
+    event.remove(server.engine, 'before_cursor_execute', capture)
+    connection.close()
+
+    unaudited = {rule.endpoint for rule in server.app.url_map.iter_rules() if rule.endpoint != 'static'} - set(report)
+    return report, sorted(unaudited)
+
+def finding_keys(report):
+    return sorted({f'{endpoint} {finding["kind"]} {finding["table"]}'
+        for endpoint, route in report.items()
+        for statement in route['statements']
+        for finding in statement['findings']})
+
+if __name__ == '__main__':
+    args = parse()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'audit.db')
+    num_users, num_jobs = workload.seed(db_path, args.users)
+    server = workload.load_app(db_path)
+    report, unaudited = audit(server, num_users, num_jobs, args.ignore_non_covering)
+
+    for endpoint, route in report.items():
+        print(f'{endpoint} ({route["path"]}, status {route["status"]})')
+        for statement in route['statements']:
+            for finding in statement['findings']:
+                print(f'    {finding["kind"]}: {finding["detail"]}')
+                print(f'        in: {statement["statement"][:150]}')
+
+    if len(unaudited) > 0:
+        print(f'\nRoutes without a scenario: {", ".join(unaudited)}')
+
+    failed = [route['path'] for route in report.values() if workload.unexpected_statuses([route['status']])]
+    if len(failed) > 0:
+        print(f'\nRoutes answering with an unexpected status: {", ".join(failed)}')
+
+    if args.report is not None:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
+    if args.baseline is not None:
+        keys = finding_keys(report)
+        if args.write_baseline:
+            with open(args.baseline, 'w') as baseline_file:
+                json.dump(keys, baseline_file, indent=4)
+            print(f'\nWrote {len(keys)} findings to {args.baseline}')
+        else:
+            with open(args.baseline) as baseline_file:
+                regressions = sorted(set(keys) - set(json.load(baseline_file)))
+            if len(regressions) > 0:
+                print('\nNew findings not in the baseline:')
+                print('\n'.join(f'    {key}' for key in regressions))
+                sys.exit(1)
+            print('\nNo new findings compared to the baseline.')
+
+    if len(failed) > 0:
+        sys.exit(1)
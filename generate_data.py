@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+from array import array
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, insert, event
+import job_stats
+from models import search_key, Base, Users, Profiles, Experience, Connections, JobPostings, JobApplications, JobsMarked, UserPreferences, Conversations, Messages, Notifications
+
+# Bulk creates a synthetic database for load testing, using test-values.json as vocabulary:
+#   python3 generate_data.py load.db --users 1000000
+# Rows are generated deterministically from --seed and written with executemany inserts in chunks.
+# The connection graph is grown by preferential attachment, so its degree distribution follows a
+# power law. The user with id i + 1 has a username ending in i and the password
+# test-values.json["user"]["password"][i % 5].
+
+def parse():
+    parser = argparse.ArgumentParser(description='Synthetic dataset generator')
+    parser.add_argument('db', type=str, help='Path of the SQLite file to create')
+    parser.add_argument('--users', type=int, required=True, help='Number of users to create')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of job postings (default: users / 10)')
+    parser.add_argument('--connections', type=float, default=10, help='Average number of connections per user (default: 10)')
+    parser.add_argument('--pending', type=float, default=0.1, help='Fraction of connections still pending (default: 0.1)')
+    parser.add_argument('--conversations', type=float, default=0.3, help='Fraction of connections with a conversation (default: 0.3)')
+    parser.add_argument('--messages', type=int, default=8, help='Average number of messages per conversation (default: 8)')
+    parser.add_argument('--applications', type=float, default=2, help='Average number of applications per user (default: 2)')
+    parser.add_argument('--marks', type=float, default=1, help='Average number of saved jobs per user (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--chunk', type=int, default=50000, help='Rows per insert batch (default: 50000)')
+    parser.add_argument('--force', action='store_true', help='Overwrite the database if it already exists')
+
+    return parser.parse_args()
+
+class Generator:
+    def __init__(self, engine, args):
+        self.engine = engine
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.vocabulary = json.loads(Path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test-values.json')).read_text())
+        self.num_jobs = args.jobs if args.jobs is not None else max(args.users // 10, 1)
+
+    def choice(self, obj, attr):
+        return self.rng.choice(self.vocabulary[obj][attr])
+
+    def poisson(self, mean):
+        # small means only, good enough for row counts
+        count, threshold, product = 0, pow(2.718281828459045, -mean), self.rng.random()
+        while product > threshold:
+            count += 1
+            product *= self.rng.random()
+        return count
+
+    def insert(self, connection, table, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.args.chunk:
+                connection.execute(insert(table), chunk)
+                chunk = []
+        if len(chunk) > 0:
+            connection.execute(insert(table), chunk)
+
+    def users(self):
+        password_hashes = [hashlib.sha256(password.encode()).hexdigest() for password in self.vocabulary['user']['password']]
+        firstnames, lastnames = self.vocabulary['user']['firstname'], self.vocabulary['user']['lastname']
+        # indices into the vocabulary, for the search keys of the profiles
+        self.firstnames, self.lastnames = array('i'), array('i')
+        for i in range(self.args.users):
+            self.firstnames.append(self.rng.randrange(len(firstnames)))
+            self.lastnames.append(self.rng.randrange(len(lastnames)))
+            firstname, lastname = firstnames[self.firstnames[-1]], lastnames[self.lastnames[-1]]
+            yield {
+                'id': i + 1,
+                'username': f'{firstname.lower()}{lastname.lower()}{i}',
+                'firstname': firstname,
+                'lastname': lastname,
+                'passwordHash': password_hashes[i % len(password_hashes)],
+                'tier': 'plus' if self.rng.random() < 0.2 else 'standard'
+            }
+
+    def profiles(self):
+        firstname_keys = [search_key(name) for name in self.vocabulary['user']['firstname']]
+        lastname_keys = [search_key(name) for name in self.vocabulary['user']['lastname']]
+        for i in range(self.args.users):
+            row = {
+                'user_id': i + 1,
+                'bio': self.choice('profile', 'bio') if self.rng.random() < 0.7 else None,
+                'university': self.choice('profile', 'university'),
+                'major': self.choice('profile', 'major'),
+                'years_attended': self.choice('profile', 'years-attended') if self.rng.random() < 0.7 else None,
+                'firstname_key': firstname_keys[self.firstnames[i]],
+                'lastname_key': lastname_keys[self.lastnames[i]]
+            }
+            row['university_key'], row['major_key'] = search_key(row['university']), search_key(row['major'])
+            yield row
+
+    def preferences(self):
+        for i in range(self.args.users):
+            yield {
+                'user_id': i + 1,
+                'email_notifications_enabled': self.rng.random() < 0.8,
+                'sms_notifications_enabled': self.rng.random() < 0.5,
+                'targeted_advertising_enabled': self.rng.random() < 0.6,
+                'language': 'english' if self.rng.random() < 0.85 else 'spanish'
+            }
+
+    def experience(self):
+        for i in range(self.args.users):
+            for _ in range(self.rng.randint(0, 3)):
+                start_date = date(2015, 1, 1) + timedelta(days=self.rng.randint(0, 2500))
+                yield {
+                    'user_id': i + 1,
+                    'title': self.choice('job', 'title'),
+                    'employer': self.choice('job', 'employer'),
+                    'start_date': start_date,
+                    'end_date': start_date + timedelta(days=self.rng.randint(60, 700)),
+                    'location': self.choice('job', 'location'),
+                    'description': self.choice('job', 'description')
+                }
+
+    def connections(self):
+        # preferential attachment: every endpoint of every edge is stored once in `endpoints`,
+        # so a uniform pick from it selects an existing user with probability proportional to its degree
+        endpoints = array('i')
+        self.accepted = array('i')
+        edges_per_user = self.args.connections / 2
+        for user_id in range(2, self.args.users + 1):
+            num_edges = min(self.poisson(edges_per_user), user_id - 1)
+            targets = set()
+            while len(targets) < num_edges:
+                if len(endpoints) == 0 or self.rng.random() < 0.1:
+                    targets.add(self.rng.randint(1, user_id - 1))
+                else:
+                    targets.add(endpoints[self.rng.randrange(len(endpoints))])
+
+            for target in targets:
+                endpoints.append(user_id)
+                endpoints.append(target)
+                pending = self.rng.random() < self.args.pending
+                if not pending:
+                    self.accepted.append(user_id)
+                    self.accepted.append(target)
+                yield {
+                    'user_id': user_id,
+                    'connection_id': target,
+                    'request_status': 'pending' if pending else 'accepted'
+                }
+
+    def conversations(self):
+        self.conversation_edges = array('i')
+        for i in range(0, len(self.accepted), 2):
+            if self.rng.random() < self.args.conversations:
+                self.conversation_edges.append(i)
+                yield { 'id': len(self.conversation_edges), 'user1': self.accepted[i], 'user2': self.accepted[i + 1] }
+
+    def messages(self):
+        for conversation_id, i in enumerate(self.conversation_edges, start=1):
+            users = [self.accepted[i], self.accepted[i + 1]]
+            sent_at = datetime(2023, 1, 1) + timedelta(minutes=self.rng.randint(0, 500000))
+            num_messages = self.rng.randint(1, 2 * self.args.messages - 1)
+            for j in range(num_messages):
+                sent_at += timedelta(minutes=self.rng.randint(1, 600))
+                yield {
+                    'sender': self.rng.choice(users),
+                    'conversation': conversation_id,
+                    'time': sent_at,
+                    'read': j < num_messages - 2 or self.rng.random() < 0.5,
+                    'content': f'Message {j} of conversation {conversation_id}'
+                }
+
+    def job_postings(self):
+        self.posters = array('i')
+        for j in range(self.num_jobs):
+            poster = self.rng.randint(1, self.args.users)
+            self.posters.append(poster)
+            yield {
+                'id': j + 1,
+                'user_id': poster,
+                'title': self.choice('job', 'title'),
+                'description': self.choice('job', 'description'),
+                'employer': self.choice('job', 'employer'),
+                'location': self.choice('job', 'location'),
+                'salary': self.choice('job', 'salary') * 1000,
+                'deleted': self.rng.random() < 0.05
+            }
+
+    def job_interactions(self, mean, row):
+        for i in range(self.args.users):
+            jobs = {self.rng.randint(1, self.num_jobs) for _ in range(self.poisson(mean))}
+            for job_id in sorted(jobs):
+                if self.posters[job_id - 1] != i + 1:
+                    yield row(i + 1, job_id)
+
+    def applications(self):
+        today = date.today()
+        return self.job_interactions(self.args.applications, lambda user_id, job_id: {
+            'user_id': user_id,
+            'job_id': job_id,
+            'graduation_date': date(2025, 5, 1) + timedelta(days=self.rng.randint(0, 700)),
+            'ideal_start_date': date(2025, 6, 1) + timedelta(days=self.rng.randint(0, 700)),
+            'cover_letter': 'I am excited to apply for this position.',
+            'application_date': today - timedelta(days=self.rng.randint(0, 60))
+        })
+
+    def marks(self):
+        return self.job_interactions(self.args.marks, lambda user_id, job_id: { 'user_id': user_id, 'job_id': job_id })
+
+    def notifications(self):
+        for i in range(self.args.users):
+            if self.rng.random() < 0.1:
+                yield { 'user_id': i + 1, 'menu': 'main', 'content': 'Welcome to InCollege.' }
+
+    def generate(self):
+        steps = [
+            (Users, self.users),
+            (Profiles, self.profiles),
+            (UserPreferences, self.preferences),
+            (Experience, self.experience),
+            (Connections, self.connections),
+            (Conversations, self.conversations),
+            (Messages, self.messages),
+            (JobPostings, self.job_postings),
+            (JobApplications, self.applications),
+            (JobsMarked, self.marks),
+            (Notifications, self.notifications)
+        ]
+
+        with self.engine.begin() as connection:
+            for model, rows in steps:
+                start = time.time()
+                self.insert(connection, model.__table__, rows())
+                print(f'{model.__tablename__}: {time.time() - start:.1f}s')
+
+            start = time.time()
+            job_stats.rebuild(connection)
+            print(f'job_stats: {time.time() - start:.1f}s')
+
+if __name__ == '__main__':
+    args = parse()
+    if not args.db.endswith('.db'):
+        raise Exception(f'Invalid file extension of sqlite database: {args.db}')
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f'./{args.db} already exists! Use --force to overwrite it.')
+            sys.exit(1)
+        os.remove(args.db)
+
+    engine = create_engine(f'sqlite:///{args.db}')
+    Base.metadata.create_all(engine)
+
+    @event.listens_for(engine, 'connect')
+    def bulk_load_pragmas(dbapi_connection, connection_record):
+        # the database is thrown away if generation fails, so durability isn't needed while loading
+        dbapi_connection.execute('PRAGMA journal_mode = OFF')
+        dbapi_connection.execute('PRAGMA synchronous = OFF')
+        dbapi_connection.execute('PRAGMA cache_size = -262144')
+    engine.dispose()
+
+    start = time.time()
+    Generator(engine, args).generate()
+    print(f'{args.db} successfully generated with {args.users} users in {time.time() - start:.1f}s')
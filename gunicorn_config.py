@@ -0,0 +1,45 @@
+import os
+import time
+import threading
+
+# gunicorn configuration, used with `gunicorn -c gunicorn_config.py server:app`.
+#
+# The engine is created in each worker after fork rather than when server.py is imported, so the
+# app can be preloaded in the master (GUNICORN_PRELOAD=1, or --preload) and the workers share its
+# imported modules instead of each paying for the import. Each worker then fills its connection
+# pool and runs the read-only routes once, see server.warm(), in a thread so that the worker can
+# already answer /ready with a 503 meanwhile. Load balancers gating on /ready send it traffic once
+# the warm-up has succeeded; a failed warm-up is retried every GUNICORN_WARM_RETRY seconds (default 5).
+
+os.environ['DEFER_ENGINE'] = '1'
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+warm = os.environ.get('GUNICORN_WARM', '1') == '1'
+warm_retry = float(os.environ.get('GUNICORN_WARM_RETRY', 5))
+
+def on_starting(arbiter):
+    # the shared cache outlives the server, and its entries may refer to a database since recreated
+    if os.environ.get('CACHE_BACKEND') == 'shared':
+        import shared_cache
+        shared_cache.remove(os.environ.get('CACHE_PATH') or shared_cache.default_path(os.environ.get('DB_PATH', 'users.db')))
+
+def post_fork(arbiter, worker):
+    import server
+
+    server.init_engine()
+    if not warm:
+        server.app.config['READY'] = True
+        return
+
+    threading.Thread(target=warm_up, args=(server, worker), daemon=True).start()
+
+def warm_up(server, worker):
+    # server.warm() sets READY once it has succeeded
+    while True:
+        try:
+            server.warm()
+            worker.log.info('Worker %s ready', worker.pid)
+            return
+        except Exception:
+            worker.log.exception('Warm up of worker %s failed, retrying in %ss', worker.pid, warm_retry)
+            time.sleep(warm_retry)
@@ -0,0 +1,104 @@
+import os
+import time
+import argparse
+from datetime import date, timedelta
+from sqlalchemy import create_engine, select, update, delete, func, bindparam, literal, union_all
+from sqlalchemy.dialects.sqlite import insert
+from models import JobPostings, JobApplications, JobsMarked, JobStats, JobDailyApplications
+
+# Counters behind the posters' dashboard, GET /jobs-posted/stats. Each posting has a job_stats row
+# with its number of applications and marks, and job_daily_applications rows with its applications
+# per day. They are changed in the same transaction as the rows they count, by apply, mark, unmark
+# and expired-applications, so the dashboard reads a row per posting and a bucket per posting and
+# day instead of grouping over job_applications and jobs_marked.
+#
+# The dashboard shows the last JOB_STATS_DAYS days (default 30). Buckets older than that, and those
+# of deleted postings, are dropped by running `python3 job_stats.py users.db --compact` periodically,
+# e.g. daily from cron. `--rebuild` recounts everything from job_applications and jobs_marked, for
+# databases whose counters were never kept.
+
+DAYS = int(os.environ.get('JOB_STATS_DAYS', 30))
+
+# named unlike the columns, which insert() and update() reserve for their VALUES
+posting_id, application_date = bindparam('posting_id'), bindparam('application_date')
+
+def counter(column, delta):
+    # a posting's row is created by the first change to its counters
+    return insert(JobStats) \
+        .values(job_id=posting_id, **{column: max(delta, 0)}) \
+        .on_conflict_do_update(index_elements=['job_id'], set_={ column: getattr(JobStats, column) + delta })
+
+APPLIED = counter('applications', 1)
+WITHDRAWN = counter('applications', -1)
+MARKED = counter('marks', 1)
+UNMARKED = counter('marks', -1)
+
+DAY_APPLIED = insert(JobDailyApplications) \
+    .values(job_id=posting_id, day=application_date, applications=1) \
+    .on_conflict_do_update(index_elements=['job_id', 'day'], set_={ 'applications': JobDailyApplications.applications + 1 })
+
+DAY_WITHDRAWN = update(JobDailyApplications) \
+    .where(JobDailyApplications.job_id == posting_id, JobDailyApplications.day == application_date) \
+    .values(applications=JobDailyApplications.applications - 1)
+
+def applied(session, job_id, day):
+    session.execute(APPLIED, { 'posting_id': job_id })
+    session.execute(DAY_APPLIED, { 'posting_id': job_id, 'application_date': day })
+
+def withdrawn(session, job_id, day):
+    session.execute(WITHDRAWN, { 'posting_id': job_id })
+    session.execute(DAY_WITHDRAWN, { 'posting_id': job_id, 'application_date': day })
+
+def marked(session, job_id):
+    session.execute(MARKED, { 'posting_id': job_id })
+
+def unmarked(session, job_id):
+    session.execute(UNMARKED, { 'posting_id': job_id })
+
+def compact(connection, days=DAYS, today=None):
+    '''
+    Deletes the daily buckets the dashboard no longer shows, empty ones and those of deleted
+    postings. Returns the number of buckets deleted.
+    '''
+
+    since = (today or date.today()) - timedelta(days=days - 1)
+    deleted_postings = select(JobPostings.id).where(JobPostings.deleted == True)
+    return connection.execute(delete(JobDailyApplications).where(
+        (JobDailyApplications.day < since) |
+        (JobDailyApplications.applications <= 0) |
+        JobDailyApplications.job_id.in_(deleted_postings))).rowcount
+
+def rebuild(connection):
+    connection.execute(delete(JobStats))
+    connection.execute(delete(JobDailyApplications))
+
+    interactions = union_all(
+        select(JobApplications.job_id, literal(1).label('application'), literal(0).label('mark')),
+        select(JobsMarked.job_id, literal(0), literal(1))).subquery()
+    connection.execute(insert(JobStats).from_select(['job_id', 'applications', 'marks'],
+        select(interactions.c.job_id, func.sum(interactions.c.application), func.sum(interactions.c.mark))
+            .group_by(interactions.c.job_id)))
+    connection.execute(insert(JobDailyApplications).from_select(['job_id', 'day', 'applications'],
+        select(JobApplications.job_id, JobApplications.application_date, func.count())
+            .group_by(JobApplications.job_id, JobApplications.application_date)))
+
+def parse():
+    parser = argparse.ArgumentParser(description='Maintenance of the job posting counters')
+    parser.add_argument('db', type=str, help='Path to the SQLite file')
+    parser.add_argument('--compact', action='store_true', help='Delete the daily buckets older than --days')
+    parser.add_argument('--days', type=int, default=DAYS, help=f'Days of daily buckets to keep (default: JOB_STATS_DAYS, {DAYS})')
+    parser.add_argument('--rebuild', action='store_true', help='Recount all counters from the applications and marks')
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse()
+    engine = create_engine(f'sqlite:///{args.db}')
+
+    with engine.begin() as connection:
+        if args.rebuild:
+            start = time.time()
+            rebuild(connection)
+            print(f'Rebuilt the counters in {time.time() - start:.1f}s')
+        if args.compact:
+            print(f'Deleted {compact(connection, args.days)} daily buckets')
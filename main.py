@@ -1,11 +1,15 @@
 import sys
 import os
 import json
+import time
 from datetime import date, datetime
 from pathlib import Path
 import getpass
 import hashlib
 import requests
+from contextlib import nullcontext
+
+import tracing
 
 class InvalidInputError(Exception):
     def __init__(self, message):
@@ -45,14 +49,23 @@ class Menu:
         self.sms_notifications_enabled = None
         self.targeted_advertising_enabled = None
         self.language = None
+        self.tier = None
+
+        # what /login returned for the first screen after logging in, dropped once it is shown
+        self.bootstrap = None
+
+        # file the spans of the screens and requests are appended to, see tracing.py
+        self.trace_path = os.environ.get('TRACE_PATH')
 
     def main(self):
         while self.mode != 'exited':
-            self.notify()
+            with self.trace(f'screen {self.mode}'):
+                self.notify()
+                options, actions = tuple(zip(*self.options()))
 
-            options, actions = tuple(zip(*self.options()))
             print('Available actions:')
             print('\n'.join(f'{i + 1}: {option}' for i, option in enumerate(options)))
+            self.bootstrap = None
 
             try:
                 choice = get_index(input('Enter choice (enter the index): '), len(actions))
@@ -79,8 +92,12 @@ class Menu:
                 ('Exit', lambda: self.change_mode('exited'))
             ]
         elif self.mode == 'main':
-            response = self.get('/unread-messages', authenticate=True)
-            if response.status_code == 200 and (num_unread := sum(conversation['num_unread'] for conversation in response.json())) > 0:
+            if self.bootstrap is not None:
+                num_unread = self.bootstrap['unread_messages']
+            else:
+                response = self.get('/unread-messages', authenticate=True)
+                num_unread = sum(conversation['num_unread'] for conversation in response.json()) if response.status_code == 200 else 0
+            if num_unread > 0:
                 unread_notification = f' ({num_unread} unread message{"s" if num_unread > 1 else ""}!)'
             else:
                 unread_notification = ''
@@ -88,6 +105,7 @@ class Menu:
             options = [
                 ('Create/view/edit profile', lambda: self.change_mode('profile')),
                 ('Discover users', self.discover_users),
+                ('People you may know', self.people_you_may_know),
                 ('Lookup users', self.lookup_users),
                 ('Learn a skill', lambda: self.change_mode('skills')),
                 ('Send connection requests', self.send_connection_request),
@@ -121,8 +139,11 @@ class Menu:
                 ('See all job postings', self.get_job_postings),
                 ('Post a job', self.post_job),
                 ('Delete a job', self.delete_job),
+                ('Stats of my job postings', self.job_posting_stats),
+                ('See applicants to my job postings', self.job_applicants),
                 ('List applied jobs', self.applied_jobs),
                 ('List jobs not yet applied to', self.not_applied_jobs),
+                ('Recommended jobs', self.recommended_jobs),
                 ('Mark a job', self.mark),
                 ('Unmark a job', self.unmark),
                 ('Go back', lambda: self.change_mode('main')),
@@ -178,7 +199,8 @@ class Menu:
 
             options.append(('Go back', lambda: self.change_mode('main' if self.access_token else 'log-in')))
         elif self.mode == 'guest controls':
-            self.fetch_user_preferences()
+            if self.language is None:
+                self.fetch_user_preferences()
             if any(setting is None for setting in
                 [self.email_notifications_enabled, self.sms_notifications_enabled, self.targeted_advertising_enabled, self.language]):
                 print('Error fetching user preferences')
@@ -195,7 +217,8 @@ class Menu:
 
             options.append(('Go back', lambda: self.change_mode('incollege links')))
         elif self.mode == 'languages':
-            self.fetch_user_preferences()
+            if self.language is None:
+                self.fetch_user_preferences()
             if any(setting is None for setting in
                 [self.email_notifications_enabled, self.sms_notifications_enabled, self.targeted_advertising_enabled, self.language]):
                 print('Error fetching user language')
@@ -243,11 +266,36 @@ class Menu:
     def under_construction(self):
         print('Under construction')
 
+    def trace(self, name, request_id=None):
+        return tracing.record(self.trace_path, name, request_id) if self.trace_path is not None else nullcontext({})
+
+    def send(self, method, path, authenticate, data=None, content_type=None):
+        # the server echoes the request id and traces the request under it
+        request_id = tracing.new_request_id()
+        headers = { tracing.REQUEST_ID_HEADER: request_id }
+        if authenticate:
+            headers['Authorization'] = f'Bearer {self.access_token}'
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+        if self.trace_path is not None:
+            headers[tracing.TRACE_HEADER] = '1'
+
+        with self.trace(f'{method} {path}', request_id) as args:
+            start = time.perf_counter()
+            response = requests.request(method, f'{self.url}{path}', data=data, headers=headers, timeout=5)
+            args['status'] = response.status_code
+            args['bytes'] = len(response.content)
+            # Server-Timing is only sent for traced requests, the rest of the time went to the network
+            server_timing = response.headers.get('Server-Timing', '')
+            if server_timing.startswith('app;dur='):
+                args['server_ms'] = float(server_timing[len('app;dur='):])
+                args['network_ms'] = round((time.perf_counter() - start) * 1000 - args['server_ms'], 1)
+        return response
+
     def get(self, path, error_msg=None, authenticate=False):
         assert path.startswith('/'), f'Invalid path: {path}.'
 
-        headers = { 'Authorization': f'Bearer {self.access_token}' } if authenticate else {}
-        response = requests.get(f'{self.url}{path}', headers=headers, timeout=5)
+        response = self.send('GET', path, authenticate)
         if error_msg is None:
             return response
 
@@ -264,9 +312,7 @@ class Menu:
     def post(self, path, data, error_msg=None, authenticate=False):
         assert path.startswith('/'), f'Invalid path: {path}.'
 
-        headers = { 'Authorization': f'Bearer {self.access_token}' } if authenticate else {}
-        headers['Content-Type'] = 'application/json'
-        response = requests.post(f'{self.url}{path}', data=json.dumps(data), headers=headers, timeout=5)
+        response = self.send('POST', path, authenticate, data=json.dumps(data), content_type='application/json')
         if error_msg is None:
             return response
 
@@ -282,32 +328,37 @@ class Menu:
 
     def notify(self):
         notifications = []
+        bootstrap = self.bootstrap if self.mode == 'main' else None
 
-        response = self.post('/notifications', { 'menu': self.mode }, authenticate=True)
-        if response.status_code == 200:
-            for notification in response.json():
-                notifications.append(notification['content'])
+        if bootstrap is not None:
+            notifications.extend(notification['content'] for notification in bootstrap['notifications'])
+        else:
+            response = self.post('/notifications', { 'menu': self.mode }, authenticate=True)
+            if response.status_code == 200:
+                for notification in response.json():
+                    notifications.append(notification['content'])
 
         if self.mode == 'main':
-            response = self.get('/pending-requests', authenticate=True)
-            if response.status_code == 200 and len(response.json()) > 0:
+            if bootstrap is not None:
+                pending_requests, unread_messages = bootstrap['pending_requests'], bootstrap['unread_messages']
+                last_application_date, profile = bootstrap['last_application_date'], bootstrap['profile']
+            else:
+                pending_requests, unread_messages, last_application_date, profile = self.main_screen_state()
+
+            if pending_requests:
                 notifications.append('You have pending connection requests to accept or deny.')
 
-            response = self.get('/unread-messages', authenticate=True)
-            if response.status_code == 200 and sum(conversation['num_unread'] for conversation in response.json()) > 0:
+            if unread_messages:
                 notifications.append('You have messages waiting for you.')
 
-            response = self.get('/applications', authenticate=True)
-            if response.status_code == 200 and len(response.json()) > 0:
-                last_application = max(response.json(), key=lambda application: application['application-date'])
-                difference = date.today() - datetime.strptime(last_application['application-date'], '%Y-%m-%d').date()
+            if last_application_date is not None:
+                difference = date.today() - datetime.strptime(last_application_date, '%Y-%m-%d').date()
                 if difference.days >= 7:
                     notifications.append('Remember - you\'re going to want to apply to have a job when you graduate. Make sure that you start to apply for jobs today!')
 
-            response = self.get('/profile', authenticate=True)
-            if response.status_code == 200:
-                for field in response.json():
-                    if response.json()[field] is None:
+            if profile is not None:
+                for field in profile:
+                    if profile[field] is None:
                         notifications.append(f'Don\'t forget to specify {field} in your profile.')
         elif self.mode == 'job search/internship':
             response = self.get('/applications', authenticate=True)
@@ -327,26 +378,56 @@ class Menu:
 
             print()
 
+    def main_screen_state(self):
+        # what the main menu notifies about, None where a request failed
+        response = self.get('/pending-requests', authenticate=True)
+        pending_requests = len(response.json()) if response.status_code == 200 else None
+
+        response = self.get('/unread-messages', authenticate=True)
+        unread_messages = sum(conversation['num_unread'] for conversation in response.json()) if response.status_code == 200 else None
+
+        response = self.get('/applications', authenticate=True)
+        last_application_date = max((application['application-date'] for application in response.json()), default=None) \
+            if response.status_code == 200 else None
+
+        response = self.get('/profile', authenticate=True)
+        profile = response.json() if response.status_code == 200 else None
+
+        return pending_requests, unread_messages, last_application_date, profile
+
     def login(self):
         username = get_field('Please enter your username')
         password_hash = hashlib.sha256(getpass.getpass('Enter your password: ').strip().encode()).hexdigest()
 
-        self.access_token = self.post('/login', {
+        response = self.post('/login', {
             'username': username,
-            'passwordHash': password_hash
-        }, error_msg='Login unsuccessful.')['token']
+            'passwordHash': password_hash,
+            'bootstrap': True
+        }, error_msg='Login unsuccessful.')
+        self.access_token = response['token']
+
+        # the first screen is served from the bootstrap, the tier and preferences are kept
+        self.bootstrap = response['bootstrap']
+        self.tier = self.bootstrap['tier']
+        for field, value in (self.bootstrap['preferences'] or {}).items():
+            setattr(self, field, value)
+
         print('Login successful.')
         self.change_mode('main')
 
     def logout(self):
         self.access_token = None
+        self.bootstrap = None
+        self.tier = None
+        for field in ['email_notifications_enabled', 'sms_notifications_enabled', 'targeted_advertising_enabled', 'language']:
+            setattr(self, field, None)
         self.change_mode('log-in')
 
     def signup(self):
         def username_exists(username):
             try:
-                return any(username == user['username'] for user in self.get('/list-users').json())
-            except requests.JSONDecodeError:
+                return not self.post('/username-available', {'username': username}).json()['available']
+            except (requests.JSONDecodeError, KeyError):
                 return False    # signing up will be unsuccessful regardless
 
         def validate_password(password):
@@ -384,7 +465,7 @@ class Menu:
         if response.status_code == 200:
             print('You have successfully signed up! Please log in now.')
         else:
-            if response.json() == { 'error': 'Limit of ten users has been reached' }:
+            if response.json().get('error', '').startswith('Limit of'):
                 print('All permitted accounts have been created, please come back later.')
             else:
                 print(response.json())
@@ -445,8 +526,8 @@ class Menu:
             if response.status_code == 200:
                 print('Successfully added job to history.')
             else:
-                if response.json() == { 'error': 'Limit of three jobs has been reached' }:
-                    print('Limit of three jobs has been reached.')
+                if response.json().get('error', '').startswith('Limit of'):
+                    print(response.json()['error'] + '.')
                 else:
                     print('Error adding job.')
         else:
@@ -478,8 +559,8 @@ class Menu:
                 if response.status_code == 200:
                     print('Successfully added job to history.')
                 else:
-                    if response.json() == { 'error': 'Limit of three jobs has been reached' }:
-                        print('Limit of three jobs has been reached.')
+                    if response.json().get('error', '').startswith('Limit of'):
+                        print(response.json()['error'] + '.')
                     else:
                         print('Error adding job.')
                 return
@@ -492,6 +573,27 @@ class Menu:
         else:
             print('No users yet.')
 
+    def people_you_may_know(self):
+        cursor = None
+        while True:
+            page = self.post('/discover', {} if cursor is None else { 'cursor': cursor },
+                error_msg='Error retrieving suggestions.', authenticate=True)
+            if len(page['users']) == 0 and cursor is None:
+                print('No one from your university or major yet.')
+                return
+
+            for user in page['users']:
+                print(f'{user["username"]} {user["firstname"]} {user["lastname"]} (same {" and ".join(user["shared"])})')
+
+            cursor = page['cursor']
+            if cursor is None:
+                return
+            more = get_field('Show more? Respond either "yes" or "no"')
+            if more.lower() not in ['yes', 'no']:
+                raise InvalidInputError('Response neither "yes" nor "no".')
+            if more.lower() == 'no':
+                return
+
     def lookup_users(self):
         fields = {
             'firstname': get_field('Enter the user\'s first name (leave empty and press enter to skip)', nullable=True),
@@ -613,8 +715,8 @@ class Menu:
         if response.status_code == 200:
             print('Job posting created successfully.')
         else:
-            if response.json() == { 'error': 'Limit of ten job postings has been reached' }:
-                print('Limit of ten job postings has been reached.')
+            if response.json().get('error', '').startswith('Limit of'):
+                print(response.json()['error'] + '.')
             else:
                 print('Error creating job posting.')
 
@@ -636,25 +738,24 @@ class Menu:
             print('No job postings found.')
 
     def get_job_titles(self):
-        job_postings = self.get('/job-postings', error_msg='Error fetching job postings.')
-        job_applications = self.get('/applications', error_msg='Error fetching job applications.', authenticate=True)
+        job_postings = self.post('/my-job-feed', {}, error_msg='Error fetching job postings.', authenticate=True)
 
         if len(job_postings) == 0:
             print('No job postings found.')
             return
 
         for i, posting in enumerate(job_postings):
-            if posting['id'] in [application['job_id'] for application in job_applications]:
+            if posting['applied']:
                 print(f'{i + 1}) {posting["title"]} (applied)')
             else:
                 print(f'{i + 1}) {posting["title"]}')
 
         choice = job_postings[get_index(input('Enter the index of a job above to see its entire posting: '), len(job_postings))]
 
-        if choice['id'] in [application['job_id'] for application in job_applications]:
+        if choice['applied']:
             raise InvalidInputError('You have already applied to this position.')
 
-        print('\n'.join(f'{label}: {posting[label]}' for label in [
+        print('\n'.join(f'{label}: {choice[label]}' for label in [
                 'title',
                 'employer',
                 'description',
@@ -693,6 +794,52 @@ class Menu:
         self.post('/delete-job', { 'job_id': choice['id'] }, error_msg='Unable to delete job.', authenticate=True)
         print('Job successfully deleted.')
 
+    def job_posting_stats(self):
+        job_postings = self.get('/jobs-posted/stats', error_msg='Error fetching job posting stats.', authenticate=True)
+
+        if len(job_postings) == 0:
+            print('No job postings found from you.')
+            return
+
+        for posting in job_postings:
+            print(f'{posting["title"]}: {posting["applications"]} applications, saved {posting["marks"]} times')
+            for bucket in posting['daily']:
+                print(f'    {bucket["day"]}: {bucket["applications"]}')
+
+    def job_applicants(self):
+        job_postings = self.get('/jobs-posted', error_msg='Error fetching job postings.', authenticate=True)
+
+        if len(job_postings) == 0:
+            print('No job postings found from you.')
+            return
+
+        for i, posting in enumerate(job_postings):
+            print(f'{i + 1}) {posting["title"]}')
+
+        choice = job_postings[get_index(input('Enter the index of a job above to see its applicants: '), len(job_postings))]
+
+        body = { 'job_id': choice['id'] }
+        while True:
+            page = self.post('/job-applicants', body, error_msg='Error fetching applicants.', authenticate=True)
+            if len(page['applicants']) == 0 and 'cursor' not in body:
+                print('No one has applied to this job yet.')
+                return
+
+            for applicant in page['applicants']:
+                print(f'{applicant["firstname"]} {applicant["lastname"]} ({applicant["username"]}), applied on {applicant["application_date"]}')
+                print(f'    {applicant["major"]} at {applicant["university"]}, graduating {applicant["graduation_date"]}, can start {applicant["ideal_start_date"]}')
+                for job in applicant['experience']:
+                    print(f'    {job["title"]} at {job["employer"]}, {job["start_date"]} to {job["end_date"]}')
+
+            if page['cursor'] is None:
+                return
+            more = get_field('Show more? Respond either "yes" or "no"')
+            if more.lower() not in ['yes', 'no']:
+                raise InvalidInputError('Response neither "yes" nor "no".')
+            if more.lower() == 'no':
+                return
+            body['cursor'] = page['cursor']
+
     def applied_jobs(self):
         applications = self.get('/applications', error_msg='Error fetching job applications.', authenticate=True)
 
@@ -704,52 +851,57 @@ class Menu:
             print(f'{i + 1}) {title}')
 
     def not_applied_jobs(self):
-        job_postings = self.get('/job-postings', error_msg='Error fetching job postings.')
-        applications = self.get('/applications', error_msg='Error fetching job applications.', authenticate=True)
-        applications = [application['job_id'] for application in applications]
+        job_postings = self.post('/my-job-feed', { 'only-unapplied': True }, error_msg='Error fetching job postings.', authenticate=True)
 
-        if len(applications) == len(job_postings):
+        if len(job_postings) == 0:
             print('No remaining job postings found.')
             return
 
-        for i, title in enumerate([posting['title'] for posting in job_postings if posting['id'] not in applications]):
+        for i, title in enumerate([posting['title'] for posting in job_postings]):
             print(f'{i + 1}) {title}')
 
+    def recommended_jobs(self):
+        job_postings = self.post('/recommended-jobs', {}, error_msg='Error fetching recommended jobs.', authenticate=True)
+
+        if len(job_postings) == 0:
+            print('No recommended jobs found, try adding your major and job history to your profile.')
+            return
+
+        for i, posting in enumerate(job_postings):
+            print(f'{i + 1}) {posting["title"]} at {posting["employer"]}, {posting["location"]}')
+
     def mark(self):
-        job_postings = self.get('/job-postings', error_msg='Error fetching job postings.')
-        jobs_marked = self.get('/marked', error_msg='Error fetching saved jobs.', authenticate=True)
+        job_postings = self.post('/my-job-feed', {}, error_msg='Error fetching job postings.', authenticate=True)
 
         if len(job_postings) == 0:
             print('No job postings found.')
             return
 
         for i, posting in enumerate(job_postings):
-            if posting['id'] in jobs_marked:
+            if posting['marked']:
                 print(f'{i + 1}) {posting["title"]} (marked)')
             else:
                 print(f'{i + 1}) {posting["title"]}')
 
         choice = job_postings[get_index(input('Enter the index of the job to mark it as saved: '), len(job_postings))]
 
-        if choice['id'] in jobs_marked:
+        if choice['marked']:
             raise InvalidInputError('You have already marked this position.')
 
         self.post('/mark', { 'job_id': choice['id'] }, error_msg='Unable to mark job.', authenticate=True)
         print('Job successfully marked as saved.')
 
     def unmark(self):
-        job_postings = self.get('/job-postings', error_msg='Error fetching job postings.')
-        jobs_marked = self.get('/marked', error_msg='Error fetching saved jobs.', authenticate=True)
+        jobs_marked = self.post('/my-job-feed', { 'only-marked': True }, error_msg='Error fetching saved jobs.', authenticate=True)
 
         if len(jobs_marked) == 0:
             print('No jobs are marked as saved.')
             return
 
-        for i, job_id in enumerate(jobs_marked):
-            posting = [posting for posting in job_postings if posting['id'] == job_id][0]
+        for i, posting in enumerate(jobs_marked):
             print(f'{i + 1}) {posting["title"]}')
 
-        choice = job_postings[get_index(input('Enter the index of the job to unmark it: '), len(job_postings))]['id']
+        choice = jobs_marked[get_index(input('Enter the index of the job to unmark it: '), len(jobs_marked))]['id']
 
         self.post('/unmark', { 'job_id': choice }, error_msg='Unable to unmark job.', authenticate=True)
         print('Job successfully unmarked.')
@@ -772,10 +924,11 @@ class Menu:
 
     def set_user_preferences(self, field, value):
         self.post('/set-user-preferences', { field: value }, error_msg=f'Error updating {field} to {value}', authenticate=True)
+        setattr(self, field, value)
         print('Successfully updated user preferences.')
 
     def start_conversation(self):
-        tier = self.get('/profile', error_msg='Error retrieving tier.', authenticate=True)['tier']
+        tier = self.tier or self.get('/profile', error_msg='Error retrieving tier.', authenticate=True)['tier']
         if tier == 'plus':
             view_targets = get_field('You are plus tier and can message with anyone. Would you like a list of all users? Respond either "yes" or "no"')
         elif tier == 'standard':
@@ -0,0 +1,98 @@
+import time
+import argparse
+from sqlalchemy import create_engine, inspect, select, update, bindparam
+from models import Base, search_key, Users, Profiles
+import job_stats
+
+# Brings a database created by an earlier version of models.py up to date in place, e.g.
+# `python3 migrate.py users.db` before starting the new server. It creates the missing tables, adds
+# the missing columns and indexes, and fills in what the new columns and tables derive from existing
+# rows: the search keys of profiles and the job posting counters. Columns added with a server
+# default, like users.generation, need nothing more. Running it again on an up to date database
+# changes nothing.
+
+BATCH_SIZE = 10000
+
+def add_column(connection, table, column):
+    # SQLite only adds a NOT NULL column along with a default, the empty string for those filled in below
+    if column.server_default is not None:
+        default = f" DEFAULT '{column.server_default.arg}'"
+    elif not column.nullable:
+        default = " DEFAULT ''"
+    else:
+        default = ''
+    not_null = '' if column.nullable else ' NOT NULL'
+    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" '
+        f'{column.type.compile(connection.dialect)}{not_null}{default}')
+
+def backfill_search_keys(connection):
+    # the names are copied from users, see Profiles
+    keys = update(Profiles).where(Profiles.id == bindparam('profile_id')).values(
+        firstname_key=bindparam('firstname_key_value'), lastname_key=bindparam('lastname_key_value'),
+        university_key=bindparam('university_key_value'), major_key=bindparam('major_key_value'))
+    profiles = connection.execute(select(Profiles.id, Users.firstname, Users.lastname, Profiles.university, Profiles.major)
+        .join(Users, Profiles.user_id == Users.id)).all()
+    for start in range(0, len(profiles), BATCH_SIZE):
+        connection.execute(keys, [{
+            'profile_id': profile.id,
+            'firstname_key_value': search_key(profile.firstname),
+            'lastname_key_value': search_key(profile.lastname),
+            'university_key_value': search_key(profile.university),
+            'major_key_value': search_key(profile.major)
+        } for profile in profiles[start:start + BATCH_SIZE]])
+    return len(profiles)
+
+def migrate(connection):
+    '''
+    Returns the names of the tables created, the "table.column" of the columns added and the
+    names of the indexes created.
+    '''
+
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    created_tables = [table.name for table in Base.metadata.sorted_tables if table.name not in existing_tables]
+    Base.metadata.create_all(connection)
+
+    added_columns = []
+    for table in Base.metadata.sorted_tables:
+        if table.name in created_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                add_column(connection, table, column)
+                added_columns.append(f'{table.name}.{column.name}')
+
+    # create_all only creates the indexes of the tables it creates
+    existing_indexes = {index['name'] for table in existing_tables for index in inspector.get_indexes(table)}
+    created_indexes = []
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if table.name not in created_tables and index.name not in existing_indexes:
+                index.create(connection)
+                created_indexes.append(index.name)
+
+    if any(column.startswith('profiles.') and column.endswith('_key') for column in added_columns):
+        backfill_search_keys(connection)
+    if 'job_stats' in created_tables or 'job_daily_applications' in created_tables:
+        job_stats.rebuild(connection)
+
+    return created_tables, added_columns, created_indexes
+
+def parse():
+    parser = argparse.ArgumentParser(description='Upgrades a database created by an earlier version of models.py')
+    parser.add_argument('db', type=str, help='Path to the SQLite file')
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse()
+    engine = create_engine(f'sqlite:///{args.db}')
+
+    start = time.time()
+    with engine.begin() as connection:
+        created_tables, added_columns, created_indexes = migrate(connection)
+    print(f'Created tables: {", ".join(created_tables) or "none"}')
+    print(f'Added columns: {", ".join(added_columns) or "none"}')
+    print(f'Created indexes: {", ".join(created_indexes) or "none"}')
+    print(f'Migrated {args.db} in {time.time() - start:.1f}s')
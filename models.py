@@ -1,10 +1,14 @@
 import os
 import sys
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, CheckConstraint
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, CheckConstraint, Index
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
+def search_key(value):
+    # what user lookups compare: case folded with runs of whitespace collapsed to single spaces
+    return ' '.join(value.split()).casefold()
+
 class Users(Base):
     __tablename__ = 'users'
 
@@ -16,6 +20,9 @@ class Users(Base):
 
     tier = Column(String, CheckConstraint('tier IN ("standard", "plus")'), nullable=False)
 
+    # bumped whenever the profile or preferences change, see caches.invalidate_user
+    generation = Column(Integer, nullable=False, default=0, server_default='0')
+
 class Profiles(Base):
     __tablename__ = 'profiles'
 
@@ -28,6 +35,27 @@ class Profiles(Base):
     major = Column(String, nullable=False)
     years_attended = Column(Integer)
 
+    # search_key() of the user's names and of university and major, set by whoever writes them. The
+    # names are copied from users so that one index can cover any combination of the four.
+    firstname_key = Column(String, nullable=False)
+    lastname_key = Column(String, nullable=False)
+    university_key = Column(String, nullable=False)
+    major_key = Column(String, nullable=False)
+
+    # every subset of the four keys is a prefix of one of these, user_id makes them covering
+    __table_args__ = (
+        Index('profiles_lookup_flum', 'firstname_key', 'lastname_key', 'university_key', 'major_key', 'user_id'),
+        Index('profiles_lookup_lum', 'lastname_key', 'university_key', 'major_key', 'user_id'),
+        Index('profiles_lookup_umf', 'university_key', 'major_key', 'firstname_key', 'user_id'),
+        Index('profiles_lookup_mfl', 'major_key', 'firstname_key', 'lastname_key', 'user_id'),
+        Index('profiles_lookup_fu', 'firstname_key', 'university_key', 'user_id'),
+        Index('profiles_lookup_lm', 'lastname_key', 'major_key', 'user_id'),
+        # the cohorts of /discover, each read in user_id order
+        Index('profiles_cohort_um', 'university_key', 'major_key', 'user_id'),
+        Index('profiles_cohort_u', 'university_key', 'user_id'),
+        Index('profiles_cohort_m', 'major_key', 'user_id'),
+    )
+
 class Experience(Base):
     __tablename__ = 'experience'
 
@@ -41,6 +69,10 @@ class Experience(Base):
     location = Column(String)
     description = Column(String)
 
+    __table_args__ = (
+        Index('experience_user', 'user_id', 'start_date'),
+    )
+
 class Connections(Base):
     __tablename__ = 'connections'
 
@@ -51,6 +83,8 @@ class Connections(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'connection_id'),
+        # requests received by a user
+        Index('connections_received', 'connection_id', 'user_id'),
     )
 
 class JobPostings(Base):
@@ -67,6 +101,19 @@ class JobPostings(Base):
 
     deleted = Column(Boolean, nullable=False)
 
+    __table_args__ = (
+        # a poster's postings, for /jobs-posted and its stats
+        Index('job_postings_poster', 'user_id', 'id'),
+    )
+
+class JobPostingDeletions(Base):
+    __tablename__ = 'job_posting_deletions'
+
+    # appended to by /delete-job, so the recommendation index can apply the deletions made since it
+    # last looked without scanning job_postings, see recommendations.py
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey('job_postings.id', ondelete='CASCADE'), nullable=False)
+
 class JobApplications(Base):
     __tablename__ = 'job_applications'
 
@@ -81,6 +128,8 @@ class JobApplications(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'job_id'),
+        # a posting's applicants in application order, see /job-applicants
+        Index('job_applications_by_date', 'job_id', 'application_date', 'id'),
     )
 
 class JobsMarked(Base):
@@ -94,6 +143,21 @@ class JobsMarked(Base):
         UniqueConstraint('user_id', 'job_id'),
     )
 
+class JobStats(Base):
+    __tablename__ = 'job_stats'
+
+    # kept by the handlers that add and remove applications and marks, see job_stats.py
+    job_id = Column(Integer, ForeignKey('job_postings.id', ondelete='CASCADE'), primary_key=True)
+    applications = Column(Integer, nullable=False, default=0)
+    marks = Column(Integer, nullable=False, default=0)
+
+class JobDailyApplications(Base):
+    __tablename__ = 'job_daily_applications'
+
+    job_id = Column(Integer, ForeignKey('job_postings.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    applications = Column(Integer, nullable=False)
+
 class UserPreferences(Base):
     __tablename__ = 'user_preferences'
 
@@ -130,6 +194,25 @@ class Notifications(Base):
     menu = Column(String, nullable=False)
     content = Column(String, nullable=False)
 
+class Counters(Base):
+    __tablename__ = 'counters'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    owner_id = Column(Integer, nullable=False)     # 0 for counters that aren't kept per user
+    value = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('name', 'owner_id'),
+    )
+
+class Generations(Base):
+    __tablename__ = 'generations'
+
+    # incremented in every transaction that changes the table called name, see caches.table_changed
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False)
+
 if __name__ == '__main__':
     assert len(sys.argv) == 2
     database_name = sys.argv[1]
@@ -0,0 +1,147 @@
+import os
+import re
+import hmac
+import pstats
+import cProfile
+import argparse
+import tracemalloc
+from threading import Lock
+from datetime import datetime
+from urllib.parse import parse_qs
+from werkzeug.exceptions import HTTPException
+
+# On-demand profiling of a single request against the live server. A request sent with the header
+# X-Profile: cpu (or memory, or cpu,memory), or the query flag ?profile=cpu, along with the key in
+# X-Profile-Key or ?profile_key=, is run under cProfile and/or tracemalloc. The results are
+# written to PROFILE_DIR:
+#   <timestamp>-<pid>-<endpoint>.pstats     cProfile stats, for pstats or snakeviz
+#   <timestamp>-<pid>-<endpoint>.heap       tracemalloc snapshot of the allocations made during the
+#                                           request and still alive at its end
+# The response lists the files in X-Profile-Files and, for memory, reports the peak of the memory
+# traced during the request in X-Profile-Peak-Bytes, unless tracemalloc was already tracing. `python3 profiling.py <file>` summarizes one.
+#
+# Profiling is off unless PROFILING_KEY is set, and requests with a wrong key get a 403. The whole
+# WSGI call is profiled, authenticate, the handler, serialization and closing the session included.
+# A request that doesn't ask costs a lookup in the WSGI environ. tracemalloc traces every thread of
+# the process, so in a threaded worker the snapshot can include allocations of concurrent requests.
+# Profiled requests of a worker run one at a time.
+
+MODES = {'cpu', 'memory'}
+
+class Profiler:
+    '''
+    WSGI middleware profiling the requests that ask for it, see the top of this module.
+
+    Configuration is read from app.config:
+        PROFILING_KEY       key a request must present to be profiled (default None, profiling off)
+        PROFILE_DIR         directory the results are written to (default profiles)
+        PROFILE_FRAMES      frames of traceback stored per allocation by tracemalloc (default 10)
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.lock = Lock()
+        app.config.setdefault('PROFILING_KEY', None)
+        app.config.setdefault('PROFILE_DIR', 'profiles')
+        app.config.setdefault('PROFILE_FRAMES', 10)
+        app.wsgi_app = self
+
+    def __call__(self, environ, start_response):
+        # the substring test keeps parsing the query string off the path of the other requests
+        query_string = environ.get('QUERY_STRING', '')
+        query = parse_qs(query_string) if 'profile=' in query_string else {}
+        key = self.app.config['PROFILING_KEY']
+        if key is None or ('HTTP_X_PROFILE' not in environ and 'profile' not in query):
+            return self.wsgi_app(environ, start_response)
+
+        modes = environ.get('HTTP_X_PROFILE') or query['profile'][0]
+        modes = {mode.strip() for mode in modes.split(',')}
+        given_key = environ.get('HTTP_X_PROFILE_KEY') or query.get('profile_key', [''])[0]
+
+        if not hmac.compare_digest(given_key.encode(), key.encode()):
+            start_response('403 FORBIDDEN', [('Content-Type', 'text/plain')])
+            return [b'Invalid profiling key.']
+        if not modes or not modes <= MODES:
+            start_response('400 BAD REQUEST', [('Content-Type', 'text/plain')])
+            return [b'X-Profile must be cpu, memory or cpu,memory.']
+
+        with self.lock:
+            return self.profile(environ, start_response, modes)
+
+    def profile(self, environ, start_response, modes):
+        captured = {}
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, list(headers)
+            return lambda data: captured.setdefault('written', []).append(data)
+
+        profile = cProfile.Profile() if 'cpu' in modes else None
+        # tracing started before the request, e.g. with PYTHONTRACEMALLOC, is left running
+        started_tracing = 'memory' in modes and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.app.config['PROFILE_FRAMES'])
+        try:
+            if profile is not None:
+                profile.enable()
+            try:
+                # the body is read inside the profile too, a streamed one is produced while iterating
+                result = self.wsgi_app(environ, capture_start_response)
+                try:
+                    body = captured.get('written', []) + list(result)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            finally:
+                if profile is not None:
+                    profile.disable()
+            snapshot = tracemalloc.take_snapshot() if 'memory' in modes else None
+            # the peak is only the request's if the tracing started with it
+            _, peak = tracemalloc.get_traced_memory() if started_tracing else (None, None)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f'{datetime.now().strftime("%Y%m%dT%H%M%S.%f")}-{os.getpid()}-{self.endpoint(environ)}')
+        files = []
+        if profile is not None:
+            profile.dump_stats(stem + '.pstats')
+            files.append(stem + '.pstats')
+        if snapshot is not None:
+            snapshot.dump(stem + '.heap')
+            files.append(stem + '.heap')
+
+        headers = captured['headers'] + [('X-Profile-Files', ','.join(os.path.basename(file) for file in files))]
+        if peak is not None:
+            headers.append(('X-Profile-Peak-Bytes', str(peak)))
+        start_response(captured['status'], headers)
+        return body
+
+    def endpoint(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = re.sub(r'[^A-Za-z0-9.-]+', '_', environ.get('PATH_INFO', '').strip('/')) or 'root'
+        return endpoint
+
+def summarize(path, limit):
+    if path.endswith('.heap'):
+        snapshot = tracemalloc.Snapshot.load(path)
+        statistics = snapshot.statistics('lineno')
+        print(f'{sum(statistic.size for statistic in statistics)} bytes in {sum(statistic.count for statistic in statistics)} blocks')
+        for statistic in statistics[:limit]:
+            print(statistic)
+    else:
+        pstats.Stats(path).sort_stats('cumulative').print_stats(limit)
+
+def parse():
+    parser = argparse.ArgumentParser(description='Summarizes a profile written by a profiled request')
+    parser.add_argument('path', type=str, help='A .pstats or .heap file from PROFILE_DIR')
+    parser.add_argument('--limit', type=int, default=30, help='Number of functions or lines to print (default: 30)')
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse()
+    summarize(args.path, args.limit)
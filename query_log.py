@@ -0,0 +1,83 @@
+import logging
+import time
+from collections import Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+logger = logging.getLogger('query_log')
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryLog:
+    '''
+    Hooks into an engine's cursor events to flag slow statements and, per request, statement
+    shapes that repeat (N+1) or routes that issue more statements than their budget allows.
+
+    Configuration is read from app.config:
+        SLOW_QUERY_MS           statements slower than this are logged with their parameters (default 100)
+        N_PLUS_ONE_THRESHOLD    a statement shape repeated this many times in a request is flagged (default 5)
+        QUERY_BUDGET            default maximum number of statements per request (default None, unlimited)
+        QUERY_BUDGETS           per-endpoint overrides, e.g. { 'handlers.add_user': 30 }
+        QUERY_BUDGET_STRICT     raise QueryBudgetExceeded instead of logging, meant for tests
+    '''
+
+    def __init__(self, app=None, engine=None):
+        if app is not None:
+            self.install(app, engine)
+
+    def install(self, app, engine=None):
+        self.app = app
+        app.config.setdefault('SLOW_QUERY_MS', 100)
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('QUERY_BUDGET', None)
+        app.config.setdefault('QUERY_BUDGETS', {})
+        app.config.setdefault('QUERY_BUDGET_STRICT', False)
+
+        if engine is not None:
+            self.attach(engine)
+
+        # app level hooks run before the blueprint ones registered in server.py
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def attach(self, engine):
+        # separate from install so engines created after fork (see gunicorn_config.py) can be hooked up
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def start_request(self):
+        g.queries = []
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        handler = request.endpoint if has_request_context() else None
+
+        if elapsed * 1000 >= self.app.config['SLOW_QUERY_MS']:
+            logger.warning('slow query (%.1f ms) in %s: %s %r', elapsed * 1000, handler or '<no request>', statement, parameters)
+
+        if has_request_context() and 'queries' in g:
+            g.queries.append((statement, elapsed))
+
+    def finish_request(self, response):
+        queries = g.pop('queries', None)
+        if queries is None:
+            return response
+
+        handler = request.endpoint
+        threshold = self.app.config['N_PLUS_ONE_THRESHOLD']
+        for statement, count in Counter(statement for statement, _ in queries).items():
+            if count >= threshold:
+                logger.warning('possible N+1 in %s: statement executed %d times: %s', handler, count, statement)
+
+        budget = self.app.config['QUERY_BUDGETS'].get(handler, self.app.config['QUERY_BUDGET'])
+        if budget is not None and len(queries) > budget:
+            message = f'{handler} issued {len(queries)} queries, its budget is {budget}'
+            if self.app.config['QUERY_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
@@ -0,0 +1,70 @@
+from flask import current_app
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert
+from models import Users, Experience, JobPostings, Counters
+
+# Quotas are enforced against rows of the counters table which are incremented in the same
+# transaction as the insert they guard, so checking a quota costs one indexed UPDATE instead of a
+# count() over the guarded table, and concurrent writers can't both take the last slot.
+#
+# name: (config key, default limit, noun used in the error message, count used to seed the counter)
+QUOTAS = {
+    'users': ('USER_LIMIT', 10, 'user',
+        lambda session, owner_id: session.query(func.count(Users.id)).scalar()),
+    # deleted postings release their slot, see delete_job
+    'job_postings': ('JOB_POSTING_LIMIT', 10, 'job posting',
+        lambda session, owner_id: session.query(func.count(JobPostings.id)).filter(JobPostings.deleted == False).scalar()),
+    'experience': ('JOB_HISTORY_LIMIT', 3, 'job',
+        lambda session, owner_id: session.query(func.count(Experience.id)).filter(Experience.user_id == owner_id).scalar()),
+}
+
+NUMBERS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
+
+def parse_limit(value):
+    # None means unlimited
+    if value is None or str(value).strip().lower() == 'unlimited':
+        return None
+    return int(value)
+
+def configure(app, environ):
+    for name, (config_key, default, _, _) in QUOTAS.items():
+        app.config[config_key] = parse_limit(environ.get(config_key, default))
+
+def limit(name):
+    config_key, default, _, _ = QUOTAS[name]
+    return current_app.config.get(config_key, default)
+
+def limit_message(name):
+    _, _, noun, _ = QUOTAS[name]
+    quota = limit(name)
+    return f'Limit of {NUMBERS[quota] if quota < len(NUMBERS) else quota} {noun}{"" if quota == 1 else "s"} has been reached'
+
+def reserve(session, name, owner_id=0):
+    '''
+    Takes one unit of the quota, returns False if it has been exhausted. The counter row is created
+    on first use from a one-off count so databases created before counters existed stay correct.
+    '''
+
+    quota = limit(name)
+    statement = update(Counters) \
+        .where((Counters.name == name) & (Counters.owner_id == owner_id)) \
+        .values(value=Counters.value + 1)
+    if quota is not None:
+        statement = statement.where(Counters.value < quota)
+
+    if session.execute(statement).rowcount == 1:
+        return True
+
+    # The UPDATE also misses when the quota is exhausted, or when another writer created the row
+    # since, so whether or not this insert creates it, the conditional UPDATE decides.
+    _, _, _, count = QUOTAS[name]
+    session.execute(insert(Counters)
+        .values(name=name, owner_id=owner_id, value=count(session, owner_id))
+        .on_conflict_do_nothing(index_elements=['name', 'owner_id']))
+
+    return session.execute(statement).rowcount == 1
+
+def release(session, name, owner_id=0):
+    session.execute(update(Counters)
+        .where((Counters.name == name) & (Counters.owner_id == owner_id) & (Counters.value > 0))
+        .values(value=Counters.value - 1))
@@ -0,0 +1,228 @@
+import os
+import re
+import math
+import time
+import random
+import argparse
+from array import array
+from threading import Lock
+from collections import Counter
+
+import numpy as np
+
+import statements
+import caches
+
+# Job recommendations for POST /recommended-jobs. Each worker keeps an inverted index of the active
+# job postings: for every term, the postings containing it and the term's weight in each of them,
+# stored in growable arrays. Postings are weighted with the lnc scheme (1 + log tf, cosine
+# normalized, no idf) so a new posting never changes the weights of the others and can simply be
+# appended. The idf is applied on the user's side (ltc), computed from the current document
+# frequencies at query time. A user is scored against every posting in one pass by concatenating
+# the lists of the user's terms and summing them per posting with np.bincount.
+#
+# Deleted postings are masked out, and dropped from the term lists once they make up more than a
+# quarter of the entries. The index follows post_job and delete_job of any worker through the
+# job_postings generation: postings above the largest id loaded are appended and the deletions
+# logged in job_posting_deletions since the last refresh are applied.
+
+STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of',
+    'on', 'or', 'our', 'that', 'the', 'this', 'to', 'we', 'who', 'will', 'with', 'you', 'your'}
+
+def terms(text):
+    return [term for term in re.findall(r'[a-z0-9]+', (text or '').casefold())
+        if len(term) > 1 and term not in STOP_WORDS]
+
+def posting_terms(posting):
+    # terms of the title count twice
+    return Counter(terms(posting.title) * 2 + terms(posting.description) + terms(posting.employer))
+
+def user_terms(profile, experience_titles):
+    # what the user studies and has worked as says more than where or their bio
+    counts = Counter()
+    if profile is not None:
+        counts.update(terms(profile.major) * 2 + terms(profile.university) + terms(profile.bio))
+    for title in experience_titles:
+        counts.update(terms(title) * 2)
+    return counts
+
+class PostingIndex:
+    def __init__(self):
+        self.vocabulary = {}        # term -> term id
+        self.rows = []              # term id -> array('i') of the slots of the postings containing it
+        self.weights = []           # term id -> array('f') of the term's weight in each of them
+        self.job_ids = array('i')   # slot -> job id
+        self.posters = array('i')   # slot -> user id of the poster
+        self.alive = bytearray()    # slot -> 0 once deleted
+        self.lengths = array('i')   # slot -> number of distinct terms
+        self.slots = {}             # job id -> slot
+        self.entries = 0
+        self.dead_entries = 0
+        self.max_id = 0
+        self.max_deletion = 0       # id of the last job_posting_deletions row applied
+        self.stale = True
+        self.lock = Lock()
+        self.queries = 0
+        self.refreshes = 0
+        caches.registry['recommendations'] = self
+        caches.on_change('job_postings', self.invalidate)
+
+    def invalidate(self):
+        self.stale = True
+
+    def add(self, posting):
+        counts = posting_terms(posting)
+        slot = len(self.job_ids)
+        self.job_ids.append(posting.id)
+        self.posters.append(posting.user_id)
+        self.alive.append(1)
+        self.lengths.append(len(counts))
+        self.slots[posting.id] = slot
+
+        norm = math.sqrt(sum((1 + math.log(count)) ** 2 for count in counts.values()))
+        for term, count in counts.items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.rows)
+                self.rows.append(array('i'))
+                self.weights.append(array('f'))
+            self.rows[term_id].append(slot)
+            self.weights[term_id].append((1 + math.log(count)) / norm)
+        self.entries += len(counts)
+
+    def remove(self, job_id):
+        slot = self.slots.pop(job_id, None)
+        if slot is None:
+            return
+        self.alive[slot] = 0
+        self.dead_entries += self.lengths[slot]
+
+    def compact(self):
+        # drops the entries of deleted postings from the term lists, which also makes the
+        # document frequencies exact again
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        self.entries = 0
+        for term_id, rows in enumerate(self.rows):
+            if len(rows) == 0:
+                continue
+            rows_np = np.frombuffer(rows, dtype=np.int32)
+            keep = alive[rows_np]
+            if not keep.all():
+                weights = np.frombuffer(self.weights[term_id], dtype=np.float32)[keep]
+                rows_np = rows_np[keep]
+                self.rows[term_id] = array('i', rows_np.tobytes())
+                self.weights[term_id] = array('f', weights.tobytes())
+            self.entries += int(keep.sum())
+        self.dead_entries = 0
+
+    def refresh(self, connection):
+        with self.lock:
+            self.stale = False      # set before loading so a change made meanwhile triggers another refresh
+            self.refreshes += 1
+            if self.max_id > 0:
+                for deletion in connection.execute(statements.JOB_POSTING_DELETIONS_AFTER, { 'id': self.max_deletion }):
+                    self.remove(deletion.job_id)
+                    self.max_deletion = deletion.id
+            else:
+                # the first load leaves out the postings deleted so far
+                self.max_deletion = connection.execute(statements.LAST_JOB_POSTING_DELETION).scalar()
+
+            for posting in connection.execute(statements.JOB_POSTINGS_AFTER, { 'id': self.max_id }):
+                self.add(posting)
+                self.max_id = posting.id
+
+            if self.dead_entries * 4 > self.entries:
+                self.compact()
+
+    def recommend(self, session, user_id, k):
+        '''
+        Returns [(job id, score)] of the k postings most similar to the user's profile and job
+        history, best first, leaving out the user's own postings and the ones they applied to.
+        '''
+
+        if self.stale:
+            self.refresh(session.connection())
+
+        connection = session.connection()
+        profile = connection.execute(statements.PROFILE_TEXT, { 'user_id': user_id }).one_or_none()
+        titles = connection.execute(statements.EXPERIENCE_TITLES, { 'user_id': user_id }).scalars().all()
+        applied = connection.execute(statements.APPLIED_JOB_IDS, { 'user_id': user_id }).scalars().all()
+        counts = user_terms(profile, titles)
+
+        with self.lock:
+            self.queries += 1
+            num_postings = len(self.slots)
+            query = {}
+            for term, count in counts.items():
+                term_id = self.vocabulary.get(term)
+                if term_id is not None and len(self.rows[term_id]) > 0:
+                    # document frequencies include deleted postings not compacted away yet
+                    idf = math.log((num_postings + 1) / min(len(self.rows[term_id]), num_postings + 1)) + 1
+                    query[term_id] = (1 + math.log(count)) * idf
+            if not query:
+                return []
+
+            norm = math.sqrt(sum(weight ** 2 for weight in query.values()))
+            rows = np.concatenate([np.frombuffer(self.rows[term_id], dtype=np.int32) for term_id in query])
+            weights = np.concatenate([np.frombuffer(self.weights[term_id], dtype=np.float32) * np.float32(weight / norm)
+                for term_id, weight in query.items()])
+            scores = np.bincount(rows, weights=weights, minlength=len(self.job_ids))
+
+            scores *= np.frombuffer(self.alive, dtype=np.uint8)
+            scores[np.frombuffer(self.posters, dtype=np.int32) == user_id] = 0
+            scores[[self.slots[job_id] for job_id in applied if job_id in self.slots]] = 0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                # the k best, breaking ties at the k-th score in favor of newer postings
+                kth = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+                above = candidates[scores[candidates] > kth]
+                candidates = np.concatenate([above, candidates[scores[candidates] == kth][::-1][:k - len(above)]])
+            candidates = candidates[np.lexsort((-candidates, -scores[candidates]))]
+            return [(self.job_ids[slot], round(float(scores[slot]), 4)) for slot in candidates]
+
+    def stats(self):
+        return {
+            'postings': len(self.slots),
+            'terms': len(self.vocabulary),
+            'entries': self.entries,
+            'dead_entries': self.dead_entries,
+            'queries': self.queries,
+            'refreshes': self.refreshes
+        }
+
+# RECOMMENDATIONS_MAX_K bounds the k a client can ask for.
+MAX_K = int(os.environ.get('RECOMMENDATIONS_MAX_K', 100))
+
+index = PostingIndex()
+
+def parse():
+    parser = argparse.ArgumentParser(description='Times building the recommendation index and querying it')
+    parser.add_argument('db', type=str, help='Database to load, e.g. one made by generate_data.py')
+    parser.add_argument('--queries', type=int, default=200, help='Number of users to recommend jobs to (default: 200)')
+    parser.add_argument('--k', type=int, default=10, help='Postings per recommendation (default: 10)')
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import Session
+    from models import Users
+
+    args = parse()
+    engine = create_engine(f'sqlite:///{args.db}')
+    with Session(engine) as session:
+        start = time.perf_counter()
+        index.refresh(session.connection())
+        print(f'Indexed {len(index.slots)} postings, {len(index.vocabulary)} terms, {index.entries} entries in {time.perf_counter() - start:.2f} s')
+
+        user_ids = session.execute(select(Users.id)).scalars().all()
+        latencies = []
+        for user_id in random.Random(0).sample(user_ids, min(args.queries, len(user_ids))):
+            start = time.perf_counter()
+            index.recommend(session, user_id, args.k)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(f'{len(latencies)} queries: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, '
+        f'p99 {latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000:.2f} ms')
@@ -1,18 +1,35 @@
-from flask import request, g, jsonify, Blueprint
-from datetime import date, datetime
+from flask import request, g, jsonify, Blueprint, current_app
+from datetime import date, datetime, timedelta
 from pathlib import Path
+import hashlib
 import time
 import jwt
 import sqlite3
 from sqlalchemy import func, literal_column, case
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
-from models import Users, Profiles, Experience, Connections, JobPostings, JobApplications, JobsMarked, UserPreferences, Conversations, Messages, Notifications
+import quotas
+import job_stats
+import statements
+import caches
+import recommendations
+from models import search_key, Users, Profiles, Experience, Connections, JobPostings, JobPostingDeletions, JobApplications, JobsMarked, UserPreferences, Conversations, Messages, Notifications
 
 handlers = Blueprint('handlers', __name__)
 authenticated_handlers = Blueprint('authenticated_handlers', __name__)
 
+def read_write(view):
+    # GET routes are served from a read-only session unless they are marked with this decorator
+    view.read_write = True
+    return view
+
+def unbounded(view):
+    # GET routes whose response grows with a whole table, left out of server.warm()
+    view.unbounded = True
+    return view
+
 @handlers.route('/list-users', methods=['GET'])
+@unbounded
 def list_users():
     labels = ['username', 'firstname', 'lastname']
     users = g.session.query(*[getattr(Users, label) for label in labels]).all()
@@ -24,38 +41,71 @@ def lookup_user():
     data = request.get_json()
 
     fields = ['firstname', 'lastname', 'university', 'major']
-    if any(field not in fields for field in data):
+    if any(field not in fields or not isinstance(value, str) for field, value in data.items()):
         return jsonify({'error': 'Invalid fields.'}), 400
     fields = list(data.keys())
 
+    # matched case insensitively through the lookup indexes on profiles
     labels = ['username', 'firstname', 'lastname']
     query = g.session.query(*[getattr(Users, label) for label in labels]) \
         .join(Profiles, Users.id == Profiles.user_id)
     for field in fields:
-        if field in ['firstname', 'lastname']:
-            query = query.filter(getattr(Users, field) == data[field])
-        elif field in ['university', 'major']:
-            query = query.filter(getattr(Profiles, field) == data[field])
+        query = query.filter(getattr(Profiles, f'{field}_key') == search_key(data[field]))
 
     matches = query.all()
 
     return jsonify({'matches': [{label: user._asdict()[label] for label in labels} for user in matches]}), 200
 
+def login_bootstrap(session, user_id, generation):
+    '''
+    What the client shows on its first screen after logging in, i.e. what /profile,
+    /user-preferences, /pending-requests, /unread-messages, /applications and /notifications for
+    the main menu would return, summarized. Like /notifications, it consumes those notifications.
+    '''
+
+    connection = session.connection()
+    profile = caches.read_through(caches.profiles, session, statements.PROFILE, user_id, generation)
+    preferences = caches.read_through(caches.preferences, session, statements.PREFERENCES, user_id, generation)
+    pending_requests = connection.execute(statements.PENDING_REQUEST_COUNT, { 'user_id': user_id }).scalar()
+    unread_messages = sum(conversation.num_unread for conversation in connection.execute(statements.UNREAD_MESSAGES, { 'user_id': user_id }))
+    last_application_date = connection.execute(statements.LAST_APPLICATION_DATE, { 'user_id': user_id }).scalar()
+
+    notifications = connection.execute(statements.NOTIFICATIONS, { 'user_id': user_id, 'menu': 'main' }).all()
+    if len(notifications) > 0:
+        connection.execute(statements.DELETE_NOTIFICATIONS, { 'ids': [notification.id for notification in notifications] })
+        session.commit()
+
+    return {
+        'profile': profile,
+        'preferences': preferences,
+        'tier': profile['tier'] if profile is not None else None,
+        'pending_requests': pending_requests,
+        'unread_messages': unread_messages,
+        'last_application_date': str(last_application_date) if last_application_date is not None else None,
+        'notifications': [{'content': notification.content} for notification in notifications]
+    }
+
 @handlers.route('/login', methods=['POST'])
 def log_in():
+    data = request.get_json()
     try:
-        username, passwordHash = tuple(request.get_json()[label] for label in ['username', 'passwordHash'])
+        username, passwordHash = tuple(data[label] for label in ['username', 'passwordHash'])
     except KeyError:
         return jsonify({'error': 'Missing data, both username and password are required.'}), 400
 
-    user = g.session.query(Users.id, Users.username, Users.passwordHash) \
+    # with "bootstrap": true the response also holds what the first screen after logging in shows
+    bootstrap = data.get('bootstrap', False)
+    if not isinstance(bootstrap, bool):
+        return jsonify({'error': 'bootstrap must be true or false.'}), 400
+
+    user = g.session.query(Users.id, Users.username, Users.passwordHash, Users.generation) \
         .filter(Users.username == username) \
         .one_or_none()
 
     if user is None:
         return jsonify({'error': 'Invalid username or password.'}), 400
 
-    user_id, retrieved_username, retrieved_passwordHash = user
+    user_id, retrieved_username, retrieved_passwordHash, generation = user
     if retrieved_passwordHash != passwordHash:
         return jsonify({'error': 'Invalid username or password.'}), 400
 
@@ -68,8 +118,20 @@ def log_in():
     }
     token = jwt.encode(payload, jwt_key, algorithm='HS256')
 
+    if bootstrap:
+        return jsonify({'token': token, 'bootstrap': login_bootstrap(g.session, user_id, generation)}), 200
     return jsonify({'token': token}), 200
 
+@handlers.route('/username-available', methods=['POST'])
+def username_available():
+    data = request.get_json()
+
+    if list(data.keys()) != ['username'] or not isinstance(data['username'], str):
+        return jsonify({'error': 'FORMAT: { "username": username }'}), 400
+
+    caches.check_generations(g.session)
+    return jsonify({'available': caches.username_filter.available(g.session, data['username'])}), 200
+
 @handlers.route('/add-user', methods=['POST'])
 def add_user():
     session = g.session
@@ -79,15 +141,15 @@ def add_user():
     if set(data.keys()) != set(fields) or data['tier'] not in ['standard', 'plus']:
         return jsonify({'error': 'Invalid fields.'}), 400
 
-    if session.query(Users).count() >= 10:
-        return jsonify({'error': 'Limit of ten users has been reached'}), 400
-
     for field_to_capitalize in fields[-2:]:
         if data[field_to_capitalize].strip() == '':
             return jsonify({'error': f'Invalid {field_to_capitalize}.'}), 400
         data[field_to_capitalize] = ' '.join(word[0].upper() + word[1:]
             for word in data[field_to_capitalize].strip().split(' '))
 
+    if not quotas.reserve(session, 'users'):
+        return jsonify({'error': quotas.limit_message('users')}), 400
+
     new_user = Users(**{field: data[field] for field in fields[:-2]})
     session.add(new_user)
     try:
@@ -95,7 +157,8 @@ def add_user():
     except IntegrityError:
         return jsonify({'error': 'The username you chose has already been taken.'}), 400
 
-    session.add(Profiles(user_id=new_user.id, **{field: data[field] for field in fields[-2:]}))
+    session.add(Profiles(user_id=new_user.id, **{field: data[field] for field in fields[-2:]},
+        **{f'{field}_key': search_key(data[field]) for field in ['firstname', 'lastname', 'university', 'major']}))
     session.add(UserPreferences(user_id=new_user.id, email_notifications_enabled=True,
         sms_notifications_enabled=True, targeted_advertising_enabled=True, language='english'))
     
@@ -104,19 +167,20 @@ def add_user():
             continue
 
         session.add(Notifications(user_id=user.id, menu='main', content=f'{data["firstname"]} {data["lastname"]} has joined InCollege.'))
+    caches.table_changed(session, 'users')
     session.commit()
+    caches.invalidate_table('users')
 
     return jsonify({'success': 'User successfully added'}), 200
 
 @authenticated_handlers.route('/profile', methods=['GET'])
 def get_profile():
-    labels = ['username', 'firstname', 'lastname', 'tier', 'bio', 'university', 'major', 'years_attended']
-    profile = g.session.query(*[getattr(Users if i < 4 else Profiles, label) for i, label in enumerate(labels)]) \
-        .join(Profiles, Users.id == Profiles.user_id) \
-        .filter(Users.id == g.user_id) \
-        .one_or_none()
+    profile = caches.read_through(caches.profiles, g.session, statements.PROFILE, g.user_id, g.generation)
 
-    return jsonify({label: profile._asdict()[label] for label in labels}), 200
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    return jsonify(profile), 200
 
 @authenticated_handlers.route('/friend-profile', methods=['POST'])
 def get_friend_profile():
@@ -136,6 +200,42 @@ def get_friend_profile():
 
     return jsonify({label: profile._asdict()[label] for label in labels}), 200
 
+# what the users of each /discover cohort share with the caller
+COHORTS = [['university', 'major'], ['university'], ['major']]
+
+@authenticated_handlers.route('/discover', methods=['POST'])
+def discover():
+    connection = g.session.connection()
+    data = request.get_json()
+
+    # the cursor is the cohort and user id the previous page ended at
+    limit, cursor = data.get('limit', 20), data.get('cursor', '0.0')
+    try:
+        cohort, after = (int(part) for part in cursor.split('.'))
+    except (AttributeError, ValueError):
+        cohort = None
+    if not set(data.keys()) <= {'limit', 'cursor'} or not isinstance(limit, int) or isinstance(limit, bool) \
+            or not 1 <= limit <= 100 or cohort not in range(len(COHORTS)):
+        return jsonify({'error': 'FORMAT: { "limit": 1 to 100, "cursor": cursor of the previous page }, both optional'}), 400
+
+    keys = connection.execute(statements.COHORT_KEYS, { 'user_id': g.user_id }).one_or_none()
+    if keys is None:
+        return jsonify({'users': [], 'cursor': None}), 200
+    related = connection.execute(statements.RELATED_USERS, { 'user_id': g.user_id }).scalars().all()
+
+    users = []
+    while cohort < len(COHORTS) and len(users) < limit:
+        page = connection.execute(statements.DISCOVER[cohort], { 'user_id': g.user_id, 'after': after, 'related': related,
+            'university': keys.university_key, 'major': keys.major_key, 'limit': limit - len(users) }).all()
+        users.extend({**user._asdict(), 'shared': COHORTS[cohort]} for user in page)
+        if len(users) < limit:
+            cohort, after = cohort + 1, 0
+
+    return jsonify({
+        'users': [{label: user[label] for label in ['username', 'firstname', 'lastname', 'university', 'major', 'shared']} for user in users],
+        'cursor': f'{cohort}.{users[-1]["id"]}' if cohort < len(COHORTS) else None
+    }), 200
+
 @authenticated_handlers.route('/edit-profile', methods=['POST'])
 def edit_profile():
     data = request.get_json()
@@ -161,27 +261,24 @@ def edit_profile():
         .one_or_none()
 
     setattr(profile, field, value)
+    if field in ['university', 'major']:
+        setattr(profile, f'{field}_key', search_key(value))
+    caches.invalidate_user(g.session, g.user_id)
     g.session.commit()
 
     return jsonify({'message': 'Successfully editted profile.'}), 200
 
 @authenticated_handlers.route('/job-history', methods=['GET'])
 def get_job_history():
-    labels = ['id', 'title', 'employer', 'start_date', 'end_date', 'location', 'description']
-    job_history = g.session.query(*[getattr(Experience, label) for label in labels]) \
-        .filter(Experience.user_id == g.user_id) \
-        .all()
+    job_history = g.session.connection().execute(statements.JOB_HISTORY, { 'user_id': g.user_id }).all()
 
-    return jsonify([{label: job._asdict()[label] for label in labels} for job in job_history]), 200
+    return jsonify([job._asdict() for job in job_history]), 200
 
 @authenticated_handlers.route('/add-job-history', methods=['POST'])
 def add_job_history():
     session = g.session
     data = request.get_json()
 
-    if session.query(Experience).filter(Experience.user_id == g.user_id).count() >= 3:
-        return jsonify({'error': 'Limit of three jobs has been reached' }), 400
-
     labels = ['title', 'employer', 'start_date', 'end_date', 'location', 'description']     # the first four fields are required
     invalid_field_specified = any(field not in labels for field in data.keys())
     required_fields_specified = all(field in data.keys() for field in labels[:4])
@@ -194,6 +291,9 @@ def add_job_history():
         except ValueError:
             return jsonify({'error': f'Invalid {date_label}: {data[date_label]}'}), 400
 
+    if not quotas.reserve(session, 'experience', g.user_id):
+        return jsonify({'error': quotas.limit_message('experience')}), 400
+
     session.add(Experience(user_id=g.user_id, **data))
     session.commit()
 
@@ -243,6 +343,7 @@ def remove_job_history():
         return jsonify({'error': f'Invalid job id.'}), 400
 
     session.delete(job)
+    quotas.release(session, 'experience', g.user_id)
     session.commit()
 
     return jsonify({'message': 'Successfully removed job.'}), 200
@@ -259,37 +360,30 @@ def make_connection_request():
     if g.username == target_username:
         return jsonify({'error': 'You cannot connect with yourself.'}), 400
 
-    target = session.query(Users.id) \
-        .filter(Users.username == target_username) \
-        .one_or_none()
+    target = caches.resolve_username(session, target_username)
     if target is None:
         return jsonify({'error': 'User not found.'}), 404
+    target_id, _ = target
 
     existing_connections = session.query(Connections).filter(
-            ((Connections.user_id == g.user_id) & (Connections.connection_id == target.id))
-            | ((Connections.user_id == target.id) & (Connections.connection_id == g.user_id))
+            ((Connections.user_id == g.user_id) & (Connections.connection_id == target_id))
+            | ((Connections.user_id == target_id) & (Connections.connection_id == g.user_id))
         ).count()
     if existing_connections > 0:
         return jsonify({'error':
             'Either you are already following each other or one of you has an open connection request to the other.'
         }), 400
 
-    session.add(Connections(user_id=g.user_id, connection_id=target.id, request_status="pending"))
+    session.add(Connections(user_id=g.user_id, connection_id=target_id, request_status="pending"))
     session.commit()
 
     return jsonify({'message': f'Connections request sent to {target_username}'}), 200
 
 @authenticated_handlers.route('/pending-requests', methods=['GET'])
 def pending_requests():
-    pending_connection_requests = g.session.query(Users.username, Users.firstname, Users.lastname) \
-        .join(Connections, Users.id == Connections.user_id) \
-        .filter(Connections.connection_id == g.user_id, Connections.request_status == "pending") \
-        .all()
+    pending_connection_requests = g.session.connection().execute(statements.PENDING_REQUESTS, { 'user_id': g.user_id }).all()
 
-    return jsonify([
-        {label: request_sender._asdict()[label] for label in ['username', 'firstname', 'lastname']}
-        for request_sender in pending_connection_requests
-    ]), 200
+    return jsonify([request_sender._asdict() for request_sender in pending_connection_requests]), 200
 
 @authenticated_handlers.route('/accept-requests', methods=['POST'])
 def accept_requests():
@@ -304,13 +398,13 @@ def accept_requests():
     for username in users_to_accept + users_to_deny:
         username = username['username']
 
-        connection_request = session.query(Connections) \
-            .join(Users, Connections.user_id == Users.id) \
-            .filter((Users.username == username) &
+        sender = caches.resolve_username(session, username)
+        connection_request = None if sender is None else session.query(Connections) \
+            .filter((Connections.user_id == sender[0]) &
                 (Connections.connection_id == g.user_id) &
                 (Connections.request_status == 'pending')) \
             .one_or_none()
-        
+
         if connection_request is None:
             ignored.append({ 'username': username })
             continue
@@ -330,17 +424,9 @@ def accept_requests():
 
 @authenticated_handlers.route('/connections', methods=['GET'])
 def connections():
-    labels = ['id', 'username', 'firstname', 'lastname']
-    connections = g.session.query(*[getattr(Users, label) for label in labels]) \
-        .join(Connections, ((Users.id == Connections.user_id) & (Connections.connection_id == g.user_id)) |
-            ((Users.id == Connections.connection_id) & (Connections.user_id == g.user_id))) \
-        .filter(Connections.request_status == 'accepted') \
-        .all()
+    connections = g.session.connection().execute(statements.CONNECTIONS, { 'user_id': g.user_id }).all()
 
-    return jsonify([{label:
-        connection._asdict()[label] for label in labels}
-        for connection in connections
-    ]), 200
+    return jsonify([connection._asdict() for connection in connections]), 200
 
 @authenticated_handlers.route('/disconnect', methods=['POST'])
 def disconnect():
@@ -350,10 +436,10 @@ def disconnect():
     if username_to_disconnect == None:
         return jsonify({ 'error': 'FORMAT: { \'username\': username }'}), 400
 
-    connection = session.query(Connections) \
-        .join(Users, (Connections.user_id == Users.id) | (Connections.connection_id == Users.id)) \
-        .filter((Users.username == username_to_disconnect) & \
-            ((Connections.user_id == g.user_id) | (Connections.connection_id == g.user_id)) & \
+    target = caches.resolve_username(session, username_to_disconnect)
+    connection = None if target is None else session.query(Connections) \
+        .filter((((Connections.user_id == g.user_id) & (Connections.connection_id == target[0])) |
+                ((Connections.user_id == target[0]) & (Connections.connection_id == g.user_id))) & \
             (Connections.request_status == 'accepted')) \
         .one_or_none()
 
@@ -373,8 +459,8 @@ def post_job():
     if set(data.keys()) != set(fields):
         return jsonify({'error': 'Missing data, all fields are required.'}), 400
 
-    if session.query(JobPostings).count() >= 10:
-        return jsonify({'error': 'Limit of ten job postings has been reached' }), 400
+    if not quotas.reserve(session, 'job_postings'):
+        return jsonify({'error': quotas.limit_message('job_postings')}), 400
 
     session.add(JobPostings(**{field: data[field] for field in fields}, user_id=g.user_id, deleted=False))
     for user in session.query(Users.id).all():
@@ -383,30 +469,129 @@ def post_job():
 
         session.add(Notifications(user_id=user.id, menu='main', content=f'A new job "{data["title"]}" has been posted'))
         session.add(Notifications(user_id=user.id, menu='job search/internship', content=f'A new job "{data["title"]}" has been posted'))
+    caches.table_changed(session, 'job_postings')
     session.commit()
+    caches.invalidate_table('job_postings')
 
     return jsonify({'message': 'Job posting created successfully.'}), 200
 
+def build_job_postings():
+    # the same bytes jsonify would produce
+    postings = g.session.connection().execute(statements.JOB_POSTINGS).all()
+    body = (current_app.json.dumps([posting._asdict() for posting in postings]) + '\n').encode()
+    return body, hashlib.sha1(body).hexdigest()
+
 @handlers.route('/job-postings', methods=['GET'])
+@unbounded
 def get_job_postings():
-    fields = ['id', 'title', 'description', 'employer', 'location', 'salary']
-    postings = g.session.query(*[getattr(JobPostings, field) for field in fields], Users.username) \
-        .filter(JobPostings.deleted == False) \
-        .join(Users, JobPostings.user_id == Users.id).all()
+    caches.check_generations(g.session)
+    body, etag = caches.job_postings.get(build_job_postings)
+
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@authenticated_handlers.route('/my-job-feed', methods=['POST'])
+def my_job_feed():
+    data = request.get_json()
+
+    filters = ['only-unapplied', 'only-marked']
+    if not set(data.keys()) <= set(filters) or not all(isinstance(value, bool) for value in data.values()):
+        return jsonify({'error': 'FORMAT: { "only-unapplied": bool, "only-marked": bool }, both optional'}), 400
+
+    statement = statements.JOB_FEED[tuple(data.get(label, False) for label in filters)]
+    postings = g.session.connection().execute(statement, { 'user_id': g.user_id }).all()
+
+    return jsonify([posting._asdict() for posting in postings]), 200
+
+@authenticated_handlers.route('/recommended-jobs', methods=['POST'])
+def recommended_jobs():
+    data = request.get_json()
+
+    k = data.get('k', 10)
+    if not set(data.keys()) <= {'k'} or not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= recommendations.MAX_K:
+        return jsonify({'error': f'FORMAT: {{ "k": number of postings, 1 to {recommendations.MAX_K} }}, optional'}), 400
 
-    return jsonify([{field: posting[i] for i, field in
-        enumerate(fields + ['username'])}
-        for posting in postings]), 200
+    caches.check_generations(g.session)
+    ranked = recommendations.index.recommend(g.session, g.user_id, k)
+    postings = { posting.id: posting._asdict() for posting in g.session.connection().execute(
+        statements.JOB_POSTINGS_BY_ID, { 'ids': [job_id for job_id, _ in ranked] }) }
+
+    # a posting deleted since the index was last refreshed is left out
+    return jsonify([{**postings[job_id], 'score': score} for job_id, score in ranked if job_id in postings]), 200
 
 @authenticated_handlers.route('/jobs-posted', methods=['GET'])
 def get_jobs_posted():
-    fields = ['id', 'title', 'description', 'employer', 'location', 'salary']
-    postings = g.session.query(*[getattr(JobPostings, field) for field in fields]) \
-        .filter((JobPostings.deleted == False) & (JobPostings.user_id == g.user_id)) \
-        .all()
+    postings = g.session.connection().execute(statements.JOBS_POSTED, { 'user_id': g.user_id }).all()
+
+    return jsonify([posting._asdict() for posting in postings]), 200
 
-    return jsonify([{field: posting[i] for i, field in enumerate(fields)}
-        for posting in postings]), 200
+# the (application date, id) each order starts after
+FIRST_APPLICANT = { True: (date.max, 2 ** 62), False: (date.min, 0) }
+
+@authenticated_handlers.route('/job-applicants', methods=['POST'])
+def job_applicants():
+    connection = g.session.connection()
+    data = request.get_json()
+
+    # the cursor is the application date and id the previous page ended at
+    limit, order, cursor = data.get('limit', 20), data.get('order', 'newest'), data.get('cursor')
+    try:
+        day, application_id = cursor.split('.') if cursor is not None else (None, None)
+        position = (date.fromisoformat(day), int(application_id)) if cursor is not None else FIRST_APPLICANT[order == 'newest']
+    except (AttributeError, ValueError):
+        position = None
+    if 'job_id' not in data or not set(data.keys()) <= {'job_id', 'limit', 'order', 'cursor'} or order not in ['newest', 'oldest'] \
+            or not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= 100 or position is None:
+        return jsonify({'error': 'FORMAT: { "job_id": job_id, "limit": 1 to 100, "order": "newest" or "oldest", '
+            '"cursor": cursor of the previous page }, all but job_id optional'}), 400
+
+    if connection.execute(statements.POSTER_JOB, { 'job_id': data['job_id'], 'user_id': g.user_id }).one_or_none() is None:
+        return jsonify({'error': 'Job either does not exist or was not posted by you.'}), 404
+
+    # one more than the page to know whether there is a next one
+    applicants = connection.execute(statements.JOB_APPLICANTS[order == 'newest'], { 'job_id': data['job_id'],
+        'date': position[0], 'id': position[1], 'limit': limit + 1 }).all()
+    more, applicants = len(applicants) > limit, applicants[:limit]
+
+    # the experience of the whole page in one query
+    experience = {}
+    if len(applicants) > 0:
+        for job in connection.execute(statements.EXPERIENCE_OF_USERS, { 'user_ids': [applicant.user_id for applicant in applicants] }):
+            experience.setdefault(job.user_id, []).append({
+                'title': job.title,
+                'employer': job.employer,
+                'start_date': str(job.start_date),
+                'end_date': str(job.end_date)
+            })
+
+    return jsonify({
+        'applicants': [{
+            'username': applicant.username,
+            'firstname': applicant.firstname,
+            'lastname': applicant.lastname,
+            'university': applicant.university,
+            'major': applicant.major,
+            'years_attended': applicant.years_attended,
+            'application_date': str(applicant.application_date),
+            'graduation_date': str(applicant.graduation_date),
+            'ideal_start_date': str(applicant.ideal_start_date),
+            'experience': experience.get(applicant.user_id, [])
+        } for applicant in applicants],
+        'cursor': f'{applicants[-1].application_date}.{applicants[-1].id}' if more else None
+    }), 200
+
+@authenticated_handlers.route('/jobs-posted/stats', methods=['GET'])
+def get_jobs_posted_stats():
+    connection = g.session.connection()
+    since = date.today() - timedelta(days=job_stats.DAYS - 1)
+
+    daily = {}
+    for bucket in connection.execute(statements.JOB_DAILY_APPLICATIONS, { 'user_id': g.user_id, 'since': since }):
+        daily.setdefault(bucket.job_id, []).append({ 'day': str(bucket.day), 'applications': bucket.applications })
+
+    return jsonify([{**posting._asdict(), 'daily': daily.get(posting.id, [])}
+        for posting in connection.execute(statements.JOB_STATS, { 'user_id': g.user_id })]), 200
 
 @authenticated_handlers.route('/delete-job', methods=['POST'])
 def delete_job():
@@ -424,27 +609,24 @@ def delete_job():
     if job_to_delete is None:
         return jsonify({'error': 'Job either does not exist or was not posted by you.' }), 404
 
+    if not job_to_delete.deleted:
+        quotas.release(session, 'job_postings')
     job_to_delete.deleted = True
+    session.add(JobPostingDeletions(job_id=job_id))
+    caches.table_changed(session, 'job_postings')
     session.commit()
+    caches.invalidate_table('job_postings')
 
     return jsonify({'message': 'Job posting deleted successfully.'}), 200
 
 @authenticated_handlers.route('/user-preferences', methods=['GET'])
 def get_user_preferences():
-    labels = [
-        'email_notifications_enabled',
-        'sms_notifications_enabled',
-        'targeted_advertising_enabled',
-        'language'
-    ]
-    preferences = g.session.query(*[getattr(UserPreferences, label) for label in labels]) \
-        .filter(UserPreferences.user_id == g.user_id) \
-        .one_or_none()
+    preferences = caches.read_through(caches.preferences, g.session, statements.PREFERENCES, g.user_id, g.generation)
 
     if preferences is None:
         return jsonify({'error': 'Preferences not found'}), 404
 
-    return jsonify({label: getattr(preferences, label) for label in labels}), 200
+    return jsonify(preferences), 200
 
 @authenticated_handlers.route('/set-user-preferences', methods=['POST'])
 def set_user_preferences():
@@ -469,6 +651,7 @@ def set_user_preferences():
         .filter(UserPreferences.user_id == g.user_id) \
         .one_or_none()
     setattr(preferences, field, value)
+    caches.invalidate_user(session, g.user_id)
     session.commit()
 
     return jsonify({'message': 'Preferences updated successfully.'}), 200
@@ -501,26 +684,27 @@ def apply():
         return jsonify({'error': f'You have already applied to this job.'}), 400
 
     session.add(JobApplications(user_id=g.user_id, **data, application_date=date.today()))
+    job_stats.applied(session, data['job_id'], date.today())
     session.commit()
 
     return jsonify({'message': 'Successfully applied to job'}), 200
 
-@authenticated_handlers.route('/applications', methods=['GET'])
-def applications():
-    session = g.session
-
-    job_applications = session.query(JobApplications.job_id, JobApplications.application_date, JobPostings.title) \
-        .join(JobPostings, JobApplications.job_id == JobPostings.id) \
-        .filter((JobPostings.deleted == False) & (JobApplications.user_id == g.user_id)) \
-        .all()
-
-    return jsonify([{
+def application_list(job_applications):
+    # shared with the native route of asgi.py
+    return [{
             'job_id': application.job_id,
             'title': application.title,
             'application-date': str(application.application_date)
-        } for application in job_applications]), 200
+        } for application in job_applications]
+
+@authenticated_handlers.route('/applications', methods=['GET'])
+def applications():
+    job_applications = g.session.connection().execute(statements.APPLICATIONS, { 'user_id': g.user_id }).all()
+
+    return jsonify(application_list(job_applications)), 200
 
 @authenticated_handlers.route('/expired-applications', methods=['GET'])
+@read_write
 def expired_applications():
     session = g.session
 
@@ -536,6 +720,7 @@ def expired_applications():
 
     for application in job_applications_to_delete:
         session.delete(application)
+        job_stats.withdrawn(session, application.job_id, application.application_date)
 
     session.commit()
 
@@ -556,17 +741,16 @@ def mark():
         return jsonify({'error': f'Job doesn\'t exist.'}), 404
 
     session.add(JobsMarked(user_id=g.user_id, job_id=data['job_id']))
+    job_stats.marked(session, data['job_id'])
     session.commit()
 
     return jsonify({'message': 'Job marked successfully.'}), 200
 
 @authenticated_handlers.route('/marked', methods=['GET'])
 def marked():
-    session = g.session
-
-    jobs_marked = session.query(JobsMarked.job_id).filter(JobsMarked.user_id == g.user_id).all()
+    jobs_marked = g.session.connection().execute(statements.MARKED_JOB_IDS, { 'user_id': g.user_id }).scalars().all()
 
-    return jsonify([job.job_id for job in jobs_marked]), 200
+    return jsonify(jobs_marked), 200
 
 @authenticated_handlers.route('/unmark', methods=['POST'])
 def unmark():
@@ -584,33 +768,25 @@ def unmark():
         return jsonify({'error': f'Job isn\'t marked.'}), 404
 
     session.delete(job_mark)
+    job_stats.unmarked(session, job_mark.job_id)
     session.commit()
 
     return jsonify({'message': 'Job unmarked successfully.'}), 200
 
-@authenticated_handlers.route('/unread-messages', methods=['GET'])
-def unread_messages():
-    session = g.session
-
-    num_unread_attr = func.sum(
-            case(((Messages.read==False) & \
-                (Messages.sender != g.user_id), 1), else_=0)
-        ).label('num_unread')       # only count when 
-    conversations = session.query(Users.username, Users.firstname, Users.lastname,
-            Conversations.id, num_unread_attr) \
-        .join(Conversations, (Users.id == Conversations.user1) | (Users.id == Conversations.user2)) \
-        .join(Messages, Conversations.id == Messages.conversation) \
-        .filter(Users.id != g.user_id,
-            (Conversations.user1 == g.user_id) | (Conversations.user2 == g.user_id)) \
-        .group_by(Users.username, Users.firstname, Users.lastname, Conversations.id) \
-        .all()
-
-    return jsonify([{
+def unread_message_counts(conversations):
+    # shared with the native route of asgi.py
+    return [{
         'username': conversation.username,
         'firstname': conversation.firstname,
         'lastname': conversation.lastname,
         'num_unread': conversation.num_unread,
-    } for conversation in conversations]), 200
+    } for conversation in conversations]
+
+@authenticated_handlers.route('/unread-messages', methods=['GET'])
+def unread_messages():
+    conversations = g.session.connection().execute(statements.UNREAD_MESSAGES, { 'user_id': g.user_id }).all()
+
+    return jsonify(unread_message_counts(conversations)), 200
 
 @authenticated_handlers.route('/messages', methods=['POST'])
 def _messages():
@@ -620,14 +796,12 @@ def _messages():
     if list(data.keys()) != ['username']:
         return jsonify({'error': 'FORMAT: { "username": username }'}), 400
 
-    target_user = session.query(Users.id) \
-        .filter(Users.username == data['username']) \
-        .one_or_none()
+    target_user = caches.resolve_username(session, data['username'])
 
     if target_user is None:
         return jsonify({'error': f'{data["username"]} not found.'}), 404
     else:
-        target_user_id = target_user.id
+        target_user_id, _ = target_user
 
     conversation = session.query(Conversations) \
         .filter(((Conversations.user1 == g.user_id) & (Conversations.user2 == target_user_id)) | \
@@ -667,14 +841,12 @@ def message():
     if list(data.keys()) != ['username', 'content']:
         return jsonify({'error': 'FORMAT: { "username": username }'}), 400
 
-    target_user = session.query(Users.id) \
-        .filter(Users.username == data['username']) \
-        .one_or_none()
+    target_user = caches.resolve_username(session, data['username'])
 
     if target_user is None:
         return jsonify({'error': f'{data["username"]} not found.'}), 404
     else:
-        target_user_id = target_user.id
+        target_user_id, _ = target_user
 
     conversation = session.query(Conversations.id) \
         .filter(((Conversations.user1 == g.user_id) & (Conversations.user2 == target_user_id)) | \
@@ -699,14 +871,12 @@ def start_conversation():
     if g.username == data['username']:
         return jsonify({'error': 'You cannot DM yourself.'}), 400
 
-    target_user = session.query(Users.id) \
-        .filter(Users.username == data['username']) \
-        .one_or_none()
+    target_user = caches.resolve_username(session, data['username'])
 
     if target_user is None:
         return jsonify({'error': f'{data["username"]} not found.'}), 404
     else:
-        target_user_id = target_user.id
+        target_user_id, _ = target_user
 
     conversation = session.query(Conversations.id) \
         .filter(((Conversations.user1 == g.user_id) & (Conversations.user2 == target_user_id)) | \
@@ -720,8 +890,8 @@ def start_conversation():
         .filter(((Connections.user_id == g.user_id) & (Connections.connection_id == target_user_id)) | \
             ((Connections.user_id == target_user_id) & (Connections.connection_id == g.user_id))) \
         .one_or_none()
-    tier = session.query(Users.tier).filter(Users.id == g.user_id).one_or_none()
-    if connection is None and tier.tier == 'standard':
+    _, tier = caches.resolve_username(session, g.username)
+    if connection is None and tier == 'standard':
         return jsonify({'error': 'I\'m sorry, you are not friends with that person.'}), 400
 
     session.add(Conversations(user1=g.user_id, user2=target_user_id))
@@ -746,14 +916,12 @@ def delete_conversation():
     if list(data.keys()) != ['username']:
         return jsonify({'error': 'FORMAT: { "username": username }'}), 400
 
-    target_user = session.query(Users.id) \
-        .filter(Users.username == data['username']) \
-        .one_or_none()
+    target_user = caches.resolve_username(session, data['username'])
 
     if target_user is None:
         return jsonify({'error': f'{data["username"]} not found.'}), 404
     else:
-        target_user_id = target_user.id
+        target_user_id, _ = target_user
 
     conversation = session.query(Conversations) \
         .filter(((Conversations.user1 == g.user_id) & (Conversations.user2 == target_user_id)) | \
@@ -778,18 +946,26 @@ def _notifications():
     if list(data.keys()) != ['menu']:
         return jsonify({'error': 'FORMAT: { "menu": menu }'}), 400
 
-    notifications = session.query(Notifications) \
-        .filter(Notifications.user_id == g.user_id, Notifications.menu == data['menu']) \
-        .all()
+    notifications = session.connection().execute(statements.NOTIFICATIONS, { 'user_id': g.user_id, 'menu': data['menu'] }).all()
     response = jsonify([{'content': notification.content} for notification in notifications])
 
     if len(notifications) > 0:
-        for notification in notifications:
-            session.delete(notification)
+        session.connection().execute(statements.DELETE_NOTIFICATIONS, { 'ids': [notification.id for notification in notifications] })
         session.commit()
 
     return response, 200
 
+@handlers.route('/ready', methods=['GET'])
+def ready():
+    # used by load balancers during rolling restarts, see gunicorn_config.py
+    if not current_app.config.get('READY', True):
+        return jsonify({'ready': False}), 503
+    return jsonify({'ready': True}), 200
+
+@authenticated_handlers.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(caches.stats()), 200
+
 @handlers.route('/error', methods=['GET'])
 def error():
     assert False
@@ -5,24 +5,67 @@ import inspect
 from pathlib import Path
 import jwt
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
 from models import Base, Users
 import logging
 import argparse
 import signal
 import os
+import time
 import psutil
 
 from request_handlers import handlers, authenticated_handlers
+from query_log import QueryLog
+import tracing
+import profiling
+import quotas
+import statements
+import caches
+import recommendations
+
+class LazySession:
+    '''
+    Stands in for g.session and only opens the underlying session, and so checks out a pooled
+    connection, when a handler first uses it. Requests that fail validation or never touch the
+    database don't pay for a session at all.
+    '''
+
+    def __init__(self, Session, read_only):
+        self._Session = Session
+        self._read_only = read_only
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            with tracing.span('session begin'):
+                self._session = self._Session(info={ 'read_only': self._read_only })
+                if not self._read_only:
+                    self._session.begin()
+                self._session.connection()
+        return getattr(self._session, name)
+
+    def close(self, exception=None):
+        if self._session is None:
+            return
+
+        if exception is not None or self._read_only:
+            self._session.rollback()
+        self._session.close()
+        self._session = None
+
+def reject_writes(session, flush_context, instances):
+    if session.info.get('read_only'):
+        raise Exception(f'Attempted to write during the read-only request {request.method} {request.path}.')
 
 def create_session(Session):
-    g.session = Session()
-    g.session.begin()
+    # GET routes only read unless marked with request_handlers.read_write
+    view = app.view_functions.get(request.endpoint)
+    g.session = LazySession(Session, read_only=request.method == 'GET' and not getattr(view, 'read_write', False))
 
-def close_session(response):
-    if hasattr(g, 'session'):
-        g.session.close()
-    return response
+def close_session(exception):
+    # teardown functions run even when the handler raised, unlike after_request ones
+    if 'session' in g:
+        g.session.close(exception)
 
 def authenticate():
     try:
@@ -32,8 +75,57 @@ def authenticate():
     except (KeyError, IndexError, jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
         return 'Unauthorized', 401
 
-    if g.session.query(Users).filter(Users.id == g.user_id).one_or_none() is None:
+    user = g.session.connection().execute(statements.AUTHENTICATE, { 'user_id': g.user_id }).one_or_none()
+    if user is None:
         return 'Unauthorized', 401
+    g.generation = user.generation
+
+def init_engine():
+    '''
+    Creates the engine and binds the session factory to it. Called at import time unless
+    DEFER_ENGINE is set, which gunicorn_config.py does so the engine is only created after fork:
+    pooled SQLite connections must not be shared between processes.
+    '''
+
+    global engine
+    engine = create_engine(f'sqlite:///{db_path}')
+    Session.configure(bind=engine)
+    query_log.attach(engine)
+    tracer.attach(engine)
+    return engine
+
+def warm():
+    '''
+    Fills the connection pool, the username cache and the recommendation index, and sends every
+    read-only GET route through the test client once, so the compiled statement cache is populated
+    before /ready reports the worker ready. Routes marked request_handlers.unbounded are left out,
+    they would read whole tables. Raises if any of it fails, leaving the worker not ready.
+    '''
+
+    connections = [engine.connect() for _ in range(engine.pool.size())]
+    for connection in connections:
+        connection.close()
+
+    with engine.connect() as connection:
+        caches.warm_usernames(connection)
+        caches.username_filter.refresh(connection)
+        recommendations.index.refresh(connection)
+        user = connection.execute(select(Users.id, Users.username).limit(1)).one_or_none()
+    headers = {}
+    if user is not None:
+        payload = { 'user_id': user.id, 'username': user.username, 'exp': time.time() + 60 }
+        headers['Authorization'] = 'Bearer ' + jwt.encode(payload, Path('./jwt-key.txt').read_text().strip(), algorithm='HS256')
+
+    client = app.test_client()
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions[rule.endpoint]
+        if 'GET' in rule.methods and not getattr(view, 'read_write', False) and not getattr(view, 'unbounded', False) \
+                and rule.endpoint not in ['handlers.error', 'handlers.ready', 'authenticated_handlers.cache_stats', 'static']:
+            response = client.get(rule.rule, headers=headers)
+            if response.status_code >= 500:
+                raise Exception(f'Warming up {rule.rule} failed with status {response.status_code}')
+
+    app.config['READY'] = True
 
 def parse():
     parser = argparse.ArgumentParser(description='Server Configuration')
@@ -53,16 +145,27 @@ db_path = os.environ.get('DB_PATH' , 'users.db')
 assert os.path.exists(db_path)
 
 app = Flask(__name__)
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+app.config['TRACE_PATH'] = os.environ.get('TRACE_PATH')
+app.config['TRACE_SAMPLE_RATE'] = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+app.config['PROFILING_KEY'] = os.environ.get('PROFILING_KEY')
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+app.config['PROFILE_FRAMES'] = int(os.environ.get('PROFILE_FRAMES', 10))
+if 'QUERY_BUDGET' in os.environ:
+    app.config['QUERY_BUDGET'] = int(os.environ['QUERY_BUDGET'])
+quotas.configure(app, os.environ)     # USER_LIMIT, JOB_POSTING_LIMIT and JOB_HISTORY_LIMIT, each a number or "unlimited"
 
-engine = create_engine(f'sqlite:///{db_path}')
-Session = sessionmaker(bind=engine)
+engine = None
+Session = sessionmaker()
+event.listen(Session, 'before_flush', reject_writes)
 
 app.before_request_funcs = {
     'handlers': [ lambda: create_session(Session) ],
-    'authenticated_handlers': [lambda: create_session(Session), authenticate]
+    'authenticated_handlers': [lambda: create_session(Session), tracing.traced('authenticate', authenticate)]
 }
 
-app.after_request_funcs = {
+app.teardown_request_funcs = {
     'handlers': [ close_session ],
     'authenticated_handlers': [ close_session ]
 }
@@ -70,6 +173,15 @@ app.after_request_funcs = {
 app.register_blueprint(handlers)
 app.register_blueprint(authenticated_handlers)
 
+query_log = QueryLog(app)
+tracer = tracing.Tracer(app)
+profiler = profiling.Profiler(app)
+
+# /ready reports 503 until warm() has run, workers that aren't warmed up are ready right away
+app.config['READY'] = 'DEFER_ENGINE' not in os.environ
+if 'DEFER_ENGINE' not in os.environ:
+    init_engine()
+
 if __name__ == '__main__':
     port, db_path = parse()
     app.run(port=port, threaded=True)
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import subprocess as sp
+
+import workload
+
+# Compares the WSGI deployment (gunicorn sync workers) with the ASGI one (uvicorn asgi:app) at high
+# concurrency, using the same number of worker processes and a generated database:
+#   python3 serving_benchmark.py --db load.db --workers 4 --concurrency 256
+
+MODES = {
+    'wsgi': lambda port, workers: ['gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'server:app'],
+    'asgi': lambda port, workers: ['uvicorn', 'asgi:app', '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port), '--no-access-log'],
+}
+
+PATHS = ['/profile', '/connections', '/pending-requests', '/unread-messages', '/user-preferences', '/marked']
+
+def parse():
+    parser = argparse.ArgumentParser(description='WSGI vs ASGI serving benchmark')
+    parser.add_argument('--db', type=str, default='soak.db', help='Database to serve, generated if missing (default: soak.db)')
+    parser.add_argument('--users', type=int, default=10000, help='Number of users if the database has to be generated (default: 10000)')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes for both servers (default: 4)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256], help='Concurrent connections to test')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per measurement (default: 10)')
+    parser.add_argument('--modes', type=str, nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--port', type=int, default=8200, help='Port to launch the servers on (default: 8200)')
+    parser.add_argument('--output', type=str, default='serving-benchmark.json', help='Where to write the results')
+
+    return parser.parse_args()
+
+async def fetch(port, path, headers):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n' + \
+        ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+    writer.write(request.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+async def load(port, concurrency, duration, headers):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    rng = random.Random(0)
+
+    async def connection():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, rng.choice(PATHS), rng.choice(headers))
+            except (OSError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*[connection() for _ in range(concurrency)])
+    return latencies, errors
+
+def percentile(sorted_samples, p):
+    index = min(len(sorted_samples) - 1, max(0, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def wait_until_up(port):
+    for _ in range(100):
+        try:
+            asyncio.run(fetch(port, '/error', {}))
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise Exception(f'Server on port {port} did not start')
+
+if __name__ == '__main__':
+    args = parse()
+
+    if not os.path.exists(args.db):
+        sp.run([sys.executable, 'generate_data.py', args.db, '--users', str(args.users)], check=True)
+
+    connection = sqlite3.connect(args.db)
+    users = connection.execute('SELECT id, username FROM users ORDER BY random() LIMIT 500').fetchall()
+    connection.close()
+    headers = [workload.auth_header(user_id, username) for user_id, username in users]
+
+    results = {}
+    for mode in args.modes:
+        server = sp.Popen(MODES[mode](args.port, args.workers), env={**os.environ, 'DB_PATH': args.db},
+            stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+        try:
+            wait_until_up(args.port)
+            results[mode] = {}
+            for concurrency in args.concurrency:
+                latencies, errors = asyncio.run(load(args.port, concurrency, args.duration, headers))
+                latencies.sort()
+                result = {
+                    'requests_per_second': len(latencies) / args.duration,
+                    'errors': errors,
+                    'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+                    'p95_ms': percentile(latencies, 95) * 1000 if latencies else None,
+                    'p99_ms': percentile(latencies, 99) * 1000 if latencies else None
+                }
+                results[mode][concurrency] = result
+                print(f'{mode} concurrency {concurrency:>4}: {result["requests_per_second"]:8.1f} req/s, '
+                    f'p50 {result["p50_ms"] or 0:8.2f} ms, p99 {result["p99_ms"] or 0:8.2f} ms, {errors} errors')
+        finally:
+            server.terminate()
+            server.wait()
+
+    with open(args.output, 'w') as output_file:
+        json.dump({ 'workers': args.workers, 'duration': args.duration, 'results': results }, output_file, indent=4)
+    print(f'\nResults written to {args.output}')
@@ -0,0 +1,226 @@
+import os
+import json
+import stat
+import time
+import sqlite3
+import threading
+
+# Cache tier shared by all the workers of a host, stored in a SQLite file which by default lives in
+# /dev/shm so it never touches the disk. It has the same interface as caches.LRUCache, which is
+# what caches.make_cache returns unless CACHE_BACKEND=shared.
+#
+# Entries are evicted least recently used first once a cache holds more than max_size entries or
+# max_bytes of values. Recency is updated at most once a second per entry so that reads don't all
+# turn into writes. Values are stored as JSON rather than pickled, so a tampered file can't run
+# code in the server; tuples come back as lists. clear() bumps the cache's generation in one statement, which
+# atomically invalidates every entry of that cache in every worker; stale rows are deleted when
+# they are next read or evicted.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    cache TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    version INTEGER,
+    generation INTEGER NOT NULL,
+    expires REAL,
+    used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (cache, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (cache, used);
+CREATE TABLE IF NOT EXISTS caches (
+    cache TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0,
+    entries INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+'''
+
+def default_path(db_path):
+    # One cache file per database, so servers of different databases on one host don't mix entries.
+    # /dev/shm is writable by every user, so the files live in a directory only this user can use.
+    directory = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', f'incollege-cache-{os.getuid()}')
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise PermissionError(f'{directory} must be a directory that only the current user can access')
+
+    name = os.path.abspath(db_path).strip('/').replace('/', '_')
+    return os.path.join(directory, name)
+
+def check_owner(path):
+    # refuses files planted by another user, e.g. with CACHE_PATH in a shared directory
+    for suffix in ['', '-wal', '-shm']:
+        try:
+            status = os.lstat(path + suffix)
+        except FileNotFoundError:
+            continue
+        if stat.S_ISLNK(status.st_mode) or status.st_uid != os.getuid():
+            raise PermissionError(f'{path + suffix} is not owned by the current user')
+
+def remove(path):
+    check_owner(path)
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+class SharedCache:
+    def __init__(self, name, max_size, ttl=None, path=None, max_bytes=64 * 1024 * 1024):
+        self.name = name
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path or default_path(os.environ.get('DB_PATH', 'users.db'))
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # Entries may have been left by a server of a database since recreated, e.g. usernames of
+        # other ids. Clearing when the cache is created, in the master when the app is preloaded and
+        # in each worker otherwise, drops them however the server was launched.
+        self.clear()
+
+    def connection(self):
+        # one connection per thread, reopened after fork
+        if getattr(self.local, 'pid', None) != os.getpid():
+            check_owner(self.path)
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=1, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.executescript(SCHEMA)
+            connection.execute('INSERT OR IGNORE INTO caches (cache) VALUES (?)', (self.name,))
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def get(self, key, version=None):
+        try:
+            value = self._get(json.dumps(key), version)
+        except sqlite3.Error:
+            self.errors += 1    # a busy or broken cache is a miss, not a failed request
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _get(self, key, version):
+        connection = self.connection()
+        now = time.time()
+        row = connection.execute('''
+            SELECT entries.value, entries.version, entries.expires, entries.used, entries.generation = caches.generation
+            FROM entries JOIN caches ON caches.cache = entries.cache
+            WHERE entries.cache = ? AND entries.key = ?''', (self.name, key)).fetchone()
+        if row is None:
+            return None
+
+        value, entry_version, expires, used, current = row
+        if not current or (expires is not None and expires < now):
+            self._delete(connection, key)
+            return None
+        if entry_version != version:
+            return None
+
+        if used < now - 1:
+            connection.execute('UPDATE entries SET used = ? WHERE cache = ? AND key = ?', (now, self.name, key))
+        return json.loads(value)
+
+    def put(self, key, value, version=None):
+        self.put_many([(key, value)], version)
+
+    def put_many(self, items, version=None):
+        try:
+            self._put_many(items, version)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _put_many(self, items, version):
+        connection = self.connection()
+        now = time.time()
+        expires = None if self.ttl is None else now + self.ttl
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            generation, = connection.execute('SELECT generation FROM caches WHERE cache = ?', (self.name,)).fetchone()
+            added_entries, added_bytes = 0, 0
+            for key, value in items:
+                key, value = json.dumps(key), json.dumps(value).encode()
+                previous = connection.execute('SELECT size FROM entries WHERE cache = ? AND key = ?', (self.name, key)).fetchone()
+                connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (self.name, key, value, version, generation, expires, now, len(value)))
+                added_entries += 0 if previous is not None else 1
+                added_bytes += len(value) - (previous[0] if previous is not None else 0)
+
+            entries, size = connection.execute('''
+                UPDATE caches SET entries = entries + ?, bytes = bytes + ? WHERE cache = ? RETURNING entries, bytes''',
+                (added_entries, added_bytes, self.name)).fetchone()
+            if entries > self.max_size or size > self.max_bytes:
+                self._evict(connection, entries, size)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _evict(self, connection, entries, size):
+        # evicts down to 90% of the limits so that a full cache doesn't evict on every put
+        evicted_entries, evicted_bytes = 0, 0
+        for key, entry_size in connection.execute(
+                'SELECT key, size FROM entries WHERE cache = ? ORDER BY used', (self.name,)).fetchall():
+            if entries - evicted_entries <= self.max_size * 0.9 and size - evicted_bytes <= self.max_bytes * 0.9:
+                break
+            connection.execute('DELETE FROM entries WHERE cache = ? AND key = ?', (self.name, key))
+            evicted_entries += 1
+            evicted_bytes += entry_size
+
+        connection.execute('UPDATE caches SET entries = entries - ?, bytes = bytes - ? WHERE cache = ?',
+            (evicted_entries, evicted_bytes, self.name))
+
+    def _delete(self, connection, key):
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            deleted = connection.execute('DELETE FROM entries WHERE cache = ? AND key = ? RETURNING size', (self.name, key)).fetchone()
+            if deleted is not None:
+                connection.execute('UPDATE caches SET entries = entries - 1, bytes = bytes - ? WHERE cache = ?', (deleted[0], self.name))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def invalidate(self, key):
+        try:
+            self._delete(self.connection(), json.dumps(key))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def clear(self):
+        try:
+            self.connection().execute('UPDATE caches SET generation = generation + 1 WHERE cache = ?', (self.name,))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def stats(self):
+        # hits and misses are this worker's, the size is shared
+        try:
+            entries, size, generation = self.connection().execute(
+                'SELECT entries, bytes, generation FROM caches WHERE cache = ?', (self.name,)).fetchone()
+        except sqlite3.Error:
+            entries, size, generation = None, None, None
+
+        return {
+            'backend': 'shared',
+            'size': entries,
+            'bytes': size,
+            'generation': generation,
+            'max_size': self.max_size,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses > 0 else None
+        }
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import subprocess as sp
+import multiprocessing as mp
+from pathlib import Path
+from unittest.mock import patch
+import requests
+
+import main
+
+# Concurrent soak test: launches gunicorn against a generated database (see generate_data.py) and
+# ramps up the number of client processes, each of which drives scripted main.Menu sessions through
+# patched input the same way E2E.py's TestFactory does. Reports client-observed latency per action,
+# 5xx and SQLITE_BUSY rates per concurrency level and the level at which the server saturates:
+#   python3 soak.py --db load.db --levels 1 2 4 8 16 32 --duration 30
+
+def parse():
+    parser = argparse.ArgumentParser(description='Concurrent soak test')
+    parser.add_argument('--db', type=str, default='soak.db', help='Database to serve, generated if missing (default: soak.db)')
+    parser.add_argument('--users', type=int, default=10000, help='Number of users if the database has to be generated (default: 10000)')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help='Concurrency levels to ramp through')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds spent at each concurrency level (default: 20)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of gunicorn workers (default: 4)')
+    parser.add_argument('--port', type=int, default=8100, help='Port to launch gunicorn on (default: 8100)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--output', type=str, default='soak.json', help='Where to write the results (default: soak.json)')
+
+    return parser.parse_args()
+
+class RecordingRequests:
+    # stands in for the requests module inside main.py to time every call the menu makes
+    def __init__(self, url, samples):
+        self.url = url
+        self.samples = samples
+        self.responses = {}
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def request(self, method, url, **kwargs):
+        path = url[len(self.url):]
+        start = time.perf_counter()
+        try:
+            response = requests.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.samples.append(('request', path, time.perf_counter() - start, 'error'))
+            raise
+
+        self.samples.append(('request', path, time.perf_counter() - start, response.status_code))
+        if response.status_code == 200:
+            self.responses[path] = response.json()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+class TimedMenu(main.Menu):
+    def __init__(self, url, recorder):
+        super().__init__(url)
+        self.samples = recorder.samples
+        self.responses = recorder.responses
+        self.last_options = []
+
+    def options(self):
+        self.last_options = super().options()
+        return self.last_options
+
+class SessionScript:
+    '''
+    Input generator for one session: log in, read the notifications of the main menu, accept pending
+    requests, browse job postings, reply in a conversation and log out. Choices are made by option
+    label from the options the menu rendered last, so no extra requests are made to pick them.
+    '''
+
+    def __init__(self, menu, username, password, rng):
+        self.menu = menu
+        self.username = username
+        self.password = password
+        self.rng = rng
+        self.action = None
+        self.action_start = None
+
+    def choose(self, label, action=None):
+        labels = [option for option, _ in self.menu.last_options]
+        index = next(i for i, option in enumerate(labels) if option.startswith(label))
+
+        self.finish_action()
+        self.action, self.action_start = action or label, time.perf_counter()
+        return str(index + 1)
+
+    def finish_action(self):
+        if self.action is not None:
+            self.menu.samples.append(('action', self.action, time.perf_counter() - self.action_start, None))
+        self.action = None
+
+    def inputs(self):
+        yield self.choose('Log in')
+        yield self.username
+        yield self.password
+        if self.menu.mode != 'main':
+            yield self.choose('Exit')
+            return
+
+        yield self.choose('View requests')
+        pending = self.menu.responses.get('/pending-requests', [])
+        if len(pending) > 0:
+            yield ' '.join(user['username'] for user in pending)
+            yield ''
+
+        yield self.choose('Job search/internship')
+        yield self.choose('See all job postings')
+        yield self.choose('Go back')
+
+        yield self.choose('Messenger')
+        conversations = self.menu.responses.get('/unread-messages', [])
+        if len(conversations) > 0:
+            conversation = self.rng.choice(conversations)
+            yield self.choose(f'{conversation["firstname"]} {conversation["lastname"]}', action='Open conversation')
+            yield '2'
+            yield f'Soak test message {self.rng.random()}'
+            yield ''
+        yield self.choose('Go back')
+
+        yield self.choose('Log out')
+        yield self.choose('Exit')
+        self.finish_action()
+
+def client(url, credentials, duration, seed, results):
+    sys.stdout = open(os.devnull, 'w')
+    rng = random.Random(seed)
+    samples = []
+    recorder = RecordingRequests(url, samples)
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        username, password = rng.choice(credentials)
+        menu = TimedMenu(url, recorder)
+        script = SessionScript(menu, username, password, rng)
+        inputs = script.inputs()
+        try:
+            with patch('main.requests', recorder), patch('builtins.input', side_effect=lambda *args: next(inputs)):
+                with patch('getpass.getpass', side_effect=lambda *args: next(inputs)):
+                    menu.main()
+        except (requests.RequestException, StopIteration, ValueError) as e:
+            samples.append(('session', type(e).__name__, 0, 'error'))
+        else:
+            samples.append(('session', 'completed', 0, None))
+
+    results.put(samples)
+
+def percentile(sorted_samples, p):
+    index = min(len(sorted_samples) - 1, max(0, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def summarize(samples, duration, busy_errors):
+    requests_made = [sample for sample in samples if sample[0] == 'request']
+    server_errors = sum(1 for sample in requests_made if sample[3] == 'error' or sample[3] >= 500)
+    actions = {}
+    for kind, name, latency, _ in samples:
+        if kind == 'action':
+            actions.setdefault(name, []).append(latency)
+
+    return {
+        'sessions_completed': sum(1 for sample in samples if sample[:2] == ('session', 'completed')),
+        'sessions_failed': sum(1 for sample in samples if sample[0] == 'session' and sample[3] == 'error'),
+        'requests': len(requests_made),
+        'requests_per_second': len(requests_made) / duration,
+        'server_error_rate': server_errors / max(len(requests_made), 1),
+        'sqlite_busy_rate': busy_errors / max(len(requests_made), 1),
+        'actions': {name: {
+            'count': len(latencies),
+            'p50_ms': percentile(sorted(latencies), 50) * 1000,
+            'p95_ms': percentile(sorted(latencies), 95) * 1000,
+            'p99_ms': percentile(sorted(latencies), 99) * 1000
+        } for name, latencies in actions.items()}
+    }
+
+def saturation_point(levels):
+    # the first level that doesn't add at least 10% throughput, or that starts failing requests
+    for previous, current in zip(levels, levels[1:]):
+        if current['server_error_rate'] > 0.01 or \
+                current['requests_per_second'] < 1.1 * previous['requests_per_second']:
+            return previous['concurrency']
+    return None
+
+def credentials(db_path, limit=1000):
+    passwords = json.loads(Path('test-values.json').read_text())['user']['password']
+    connection = sqlite3.connect(db_path)
+    users = connection.execute('SELECT id, username FROM users ORDER BY random() LIMIT ?', (limit,)).fetchall()
+    connection.close()
+    return [(username, passwords[(user_id - 1) % len(passwords)]) for user_id, username in users]
+
+def start_server(db_path, port, workers, log_path):
+    log_file = open(log_path, 'w')
+    server = sp.Popen(['gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'server:app'],
+        env={**os.environ, 'DB_PATH': db_path}, stdout=log_file, stderr=sp.STDOUT)
+
+    for _ in range(100):
+        try:
+            requests.post(f'http://127.0.0.1:{port}/login', json={}, timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    raise Exception('gunicorn did not start, see ' + log_path)
+
+if __name__ == '__main__':
+    args = parse()
+
+    if not os.path.exists(args.db):
+        sp.run([sys.executable, 'generate_data.py', args.db, '--users', str(args.users), '--seed', str(args.seed)], check=True)
+
+    log_path = 'soak-gunicorn.log'
+    server = start_server(args.db, args.port, args.workers, log_path)
+    url = f'http://127.0.0.1:{args.port}'
+    users = credentials(args.db)
+
+    levels = []
+    try:
+        for concurrency in args.levels:
+            busy_before = Path(log_path).read_text().count('database is locked')
+            results = mp.Queue()
+            processes = [mp.Process(target=client, args=(url, users, args.duration, args.seed * 1000 + concurrency * 100 + i, results))
+                for i in range(concurrency)]
+            for process in processes:
+                process.start()
+            samples = [sample for _ in processes for sample in results.get()]
+            for process in processes:
+                process.join()
+
+            busy_errors = Path(log_path).read_text().count('database is locked') - busy_before
+            level = { 'concurrency': concurrency, **summarize(samples, args.duration, busy_errors) }
+            levels.append(level)
+            print(f'concurrency {concurrency:>3}: {level["requests_per_second"]:8.1f} req/s, '
+                f'{level["server_error_rate"] * 100:5.2f}% 5xx, {level["sqlite_busy_rate"] * 100:5.2f}% SQLITE_BUSY, '
+                f'{level["sessions_completed"]} sessions')
+    finally:
+        server.terminate()
+        server.wait()
+
+    saturation = saturation_point(levels)
+    print(f'\nSaturation point: {saturation if saturation is not None else "not reached"} concurrent clients')
+    with open(args.output, 'w') as output_file:
+        json.dump({ 'workers': args.workers, 'duration': args.duration, 'saturation': saturation, 'levels': levels }, output_file, indent=4)
+    print(f'Results written to {args.output}')
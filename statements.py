@@ -0,0 +1,191 @@
+from sqlalchemy import select, update, delete, func, case, bindparam, tuple_, Date
+from sqlalchemy.dialects.sqlite import insert
+from models import Users, Profiles, Experience, Connections, JobPostings, JobPostingDeletions, JobApplications, JobsMarked, JobStats, JobDailyApplications, UserPreferences, Conversations, Messages, Notifications, Generations
+
+# Statements of the hot routes, built once with bindparam placeholders. A statement's cache key is
+# memoized on the statement object, so executing one of these skips building the query, computing
+# its cache key and compiling it. They are executed on the session's connection to also skip the
+# ORM result processing, e.g. g.session.connection().execute(PROFILE, { 'user_id': g.user_id }).
+#
+# lambda_stmt was measured too, on the pinned SQLAlchemy 2.0.22 with /profile's statement: about
+# 7,000 executions per CPU second against 4,000 when building the query on every call, 10,000 for
+# a prebuilt statement on the session and 21,000 on its connection.
+
+user_id = bindparam('user_id')
+
+AUTHENTICATE = select(Users.generation).where(Users.id == user_id)
+
+BUMP_GENERATION = update(Users).where(Users.id == user_id).values(generation=Users.generation + 1)
+
+USER_BY_USERNAME = select(Users.id, Users.tier).where(Users.username == bindparam('username'))
+
+ALL_USERNAMES = select(Users.username, Users.id, Users.tier).order_by(Users.id)
+
+USERNAMES_AFTER = select(Users.id, Users.username).where(Users.id > bindparam('id')).order_by(Users.id)
+
+TABLE_GENERATIONS = select(Generations.name, Generations.value)
+
+BUMP_TABLE_GENERATION = insert(Generations) \
+    .values(name=bindparam('name'), value=1) \
+    .on_conflict_do_update(index_elements=['name'], set_={ 'value': Generations.value + 1 })
+
+PROFILE = select(Users.username, Users.firstname, Users.lastname, Users.tier,
+        Profiles.bio, Profiles.university, Profiles.major, Profiles.years_attended) \
+    .join(Profiles, Users.id == Profiles.user_id) \
+    .where(Users.id == user_id)
+
+PREFERENCES = select(UserPreferences.email_notifications_enabled, UserPreferences.sms_notifications_enabled,
+        UserPreferences.targeted_advertising_enabled, UserPreferences.language) \
+    .where(UserPreferences.user_id == user_id)
+
+PENDING_REQUESTS = select(Users.username, Users.firstname, Users.lastname) \
+    .join(Connections, Users.id == Connections.user_id) \
+    .where(Connections.connection_id == user_id, Connections.request_status == 'pending')
+
+PENDING_REQUEST_COUNT = select(func.count()) \
+    .select_from(Connections) \
+    .where(Connections.connection_id == user_id, Connections.request_status == 'pending')
+
+JOB_HISTORY = select(Experience.id, Experience.title, Experience.employer, Experience.start_date, Experience.end_date,
+        Experience.location, Experience.description) \
+    .where(Experience.user_id == user_id)
+
+CONNECTIONS = select(Users.id, Users.username, Users.firstname, Users.lastname) \
+    .join(Connections, ((Users.id == Connections.user_id) & (Connections.connection_id == user_id)) |
+        ((Users.id == Connections.connection_id) & (Connections.user_id == user_id))) \
+    .where(Connections.request_status == 'accepted')
+
+COHORT_KEYS = select(Profiles.university_key, Profiles.major_key).where(Profiles.user_id == user_id)
+
+# everyone the user is connected to or has a pending request with, in either direction
+RELATED_USERS = select(Connections.connection_id).where(Connections.user_id == user_id) \
+    .union_all(select(Connections.user_id).where(Connections.connection_id == user_id))
+
+def discover(same_university, same_major):
+    # one index range scan per cohort, see the profiles_cohort indexes
+    statement = select(Users.id, Users.username, Users.firstname, Users.lastname, Profiles.university, Profiles.major) \
+        .select_from(Profiles) \
+        .join(Users, Profiles.user_id == Users.id) \
+        .where(Profiles.user_id > bindparam('after'), Profiles.user_id != user_id,
+            Profiles.user_id.not_in(bindparam('related', expanding=True))) \
+        .order_by(Profiles.user_id) \
+        .limit(bindparam('limit'))
+
+    university, major = bindparam('university'), bindparam('major')
+    statement = statement.where(Profiles.university_key == university if same_university else Profiles.university_key != university)
+    return statement.where(Profiles.major_key == major if same_major else Profiles.major_key != major)
+
+# users sharing both the university and the major first, then the university, then the major
+DISCOVER = [discover(True, True), discover(True, False), discover(False, True)]
+
+JOB_POSTINGS = select(JobPostings.id, JobPostings.title, JobPostings.description, JobPostings.employer,
+        JobPostings.location, JobPostings.salary, Users.username) \
+    .join(Users, JobPostings.user_id == Users.id) \
+    .where(JobPostings.deleted == False)
+
+JOB_POSTINGS_BY_ID = select(JobPostings.id, JobPostings.title, JobPostings.description, JobPostings.employer,
+        JobPostings.location, JobPostings.salary, Users.username) \
+    .join(Users, JobPostings.user_id == Users.id) \
+    .where(JobPostings.id.in_(bindparam('ids', expanding=True)), JobPostings.deleted == False)
+
+JOB_POSTINGS_AFTER = select(JobPostings.id, JobPostings.user_id, JobPostings.title, JobPostings.description, JobPostings.employer) \
+    .where(JobPostings.id > bindparam('id'), JobPostings.deleted == False) \
+    .order_by(JobPostings.id)
+
+JOB_POSTING_DELETIONS_AFTER = select(JobPostingDeletions.id, JobPostingDeletions.job_id) \
+    .where(JobPostingDeletions.id > bindparam('id')) \
+    .order_by(JobPostingDeletions.id)
+
+LAST_JOB_POSTING_DELETION = select(func.coalesce(func.max(JobPostingDeletions.id), 0))
+
+# the poster's dashboard, see job_stats.py
+JOB_STATS = select(JobPostings.id, JobPostings.title,
+        func.coalesce(JobStats.applications, 0).label('applications'), func.coalesce(JobStats.marks, 0).label('marks')) \
+    .outerjoin(JobStats, JobStats.job_id == JobPostings.id) \
+    .where(JobPostings.user_id == user_id, JobPostings.deleted == False) \
+    .order_by(JobPostings.id)
+
+JOB_DAILY_APPLICATIONS = select(JobDailyApplications.job_id, JobDailyApplications.day, JobDailyApplications.applications) \
+    .join(JobPostings, JobDailyApplications.job_id == JobPostings.id) \
+    .where(JobPostings.user_id == user_id, JobPostings.deleted == False, JobDailyApplications.day >= bindparam('since'),
+        JobDailyApplications.applications > 0) \
+    .order_by(JobPostings.id, JobDailyApplications.day)
+
+JOBS_POSTED = select(JobPostings.id, JobPostings.title, JobPostings.description, JobPostings.employer,
+        JobPostings.location, JobPostings.salary) \
+    .where(JobPostings.deleted == False, JobPostings.user_id == user_id)
+
+POSTER_JOB = select(JobPostings.id) \
+    .where(JobPostings.id == bindparam('job_id'), JobPostings.user_id == user_id, JobPostings.deleted == False)
+
+def job_applicants(newest_first):
+    # a range scan of job_applications_by_date from the cursor, (application_date, id) is unique
+    position = tuple_(JobApplications.application_date, JobApplications.id)
+    cursor = tuple_(bindparam('date', type_=Date), bindparam('id'))
+    return select(JobApplications.id, JobApplications.user_id, JobApplications.application_date,
+            JobApplications.graduation_date, JobApplications.ideal_start_date, Users.username, Users.firstname,
+            Users.lastname, Profiles.university, Profiles.major, Profiles.years_attended) \
+        .join(Users, JobApplications.user_id == Users.id) \
+        .join(Profiles, JobApplications.user_id == Profiles.user_id) \
+        .where(JobApplications.job_id == bindparam('job_id'), position < cursor if newest_first else position > cursor) \
+        .order_by(JobApplications.application_date.desc() if newest_first else JobApplications.application_date,
+            JobApplications.id.desc() if newest_first else JobApplications.id) \
+        .limit(bindparam('limit'))
+
+# newest first -> statement
+JOB_APPLICANTS = { newest_first: job_applicants(newest_first) for newest_first in [True, False] }
+
+EXPERIENCE_OF_USERS = select(Experience.user_id, Experience.title, Experience.employer, Experience.start_date, Experience.end_date) \
+    .where(Experience.user_id.in_(bindparam('user_ids', expanding=True))) \
+    .order_by(Experience.user_id, Experience.start_date)
+
+LAST_APPLICATION_DATE = select(func.max(JobApplications.application_date)) \
+    .join(JobPostings, JobApplications.job_id == JobPostings.id) \
+    .where(JobApplications.user_id == user_id, JobPostings.deleted == False)
+
+APPLICATIONS = select(JobApplications.job_id, JobApplications.application_date, JobPostings.title) \
+    .join(JobPostings, JobApplications.job_id == JobPostings.id) \
+    .where(JobPostings.deleted == False, JobApplications.user_id == user_id)
+
+MARKED_JOB_IDS = select(JobsMarked.job_id).where(JobsMarked.user_id == user_id)
+
+APPLIED_JOB_IDS = select(JobApplications.job_id).where(JobApplications.user_id == user_id)
+
+PROFILE_TEXT = select(Profiles.major, Profiles.university, Profiles.bio).where(Profiles.user_id == user_id)
+
+EXPERIENCE_TITLES = select(Experience.title).where(Experience.user_id == user_id)
+
+def job_feed(only_unapplied, only_marked):
+    # the LEFT JOINs use the unique (user_id, job_id) indexes of job_applications and jobs_marked
+    statement = select(JobPostings.id, JobPostings.title, JobPostings.description, JobPostings.employer,
+            JobPostings.location, JobPostings.salary, Users.username,
+            JobApplications.id.is_not(None).label('applied'), JobsMarked.id.is_not(None).label('marked')) \
+        .join(Users, JobPostings.user_id == Users.id) \
+        .outerjoin(JobApplications, (JobApplications.user_id == user_id) & (JobApplications.job_id == JobPostings.id)) \
+        .outerjoin(JobsMarked, (JobsMarked.user_id == user_id) & (JobsMarked.job_id == JobPostings.id)) \
+        .where(JobPostings.deleted == False) \
+        .order_by(JobPostings.id)
+
+    if only_unapplied:
+        statement = statement.where(JobApplications.id.is_(None))
+    if only_marked:
+        statement = statement.where(JobsMarked.id.is_not(None))
+    return statement
+
+# (only unapplied, only marked) -> statement
+JOB_FEED = { (only_unapplied, only_marked): job_feed(only_unapplied, only_marked)
+    for only_unapplied in [False, True] for only_marked in [False, True] }
+
+UNREAD_MESSAGES = select(Users.username, Users.firstname, Users.lastname, Conversations.id,
+        # only count messages the user received
+        func.sum(case(((Messages.read == False) & (Messages.sender != user_id), 1), else_=0)).label('num_unread')) \
+    .join(Conversations, (Users.id == Conversations.user1) | (Users.id == Conversations.user2)) \
+    .join(Messages, Conversations.id == Messages.conversation) \
+    .where(Users.id != user_id, (Conversations.user1 == user_id) | (Conversations.user2 == user_id)) \
+    .group_by(Users.username, Users.firstname, Users.lastname, Conversations.id)
+
+NOTIFICATIONS = select(Notifications.id, Notifications.content) \
+    .where(Notifications.user_id == user_id, Notifications.menu == bindparam('menu'))
+
+DELETE_NOTIFICATIONS = delete(Notifications) \
+    .where(Notifications.id.in_(bindparam('ids', expanding=True)))
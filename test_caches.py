@@ -0,0 +1,78 @@
+import os
+from sqlalchemy import create_engine, update
+import statements
+from caches import LRUCache, Snapshot
+from models import Profiles
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache('test_lru', 2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['size'] == 2
+
+def test_lru_cache_versions_and_ttl():
+    cache = LRUCache('test_versions', 10)
+    cache.put('a', 1, version=3)
+    assert (cache.get('a', 3), cache.get('a', 4), cache.get('a')) == (1, None, None)
+
+    expired = LRUCache('test_ttl', 10, ttl=-1)
+    expired.put('a', 1)
+    assert expired.get('a') is None
+
+def test_cache_stats_require_a_token(get):
+    assert get('/cache-stats').status_code == 401
+    assert set(get('/cache-stats', 0).json) >= {'usernames', 'profiles', 'preferences', 'job_postings', 'username_filter'}
+
+def test_profile_edits_are_read_back(post, get):
+    assert get('/profile', 50).json['bio'] == 'Bio of user 50'
+    assert post('/edit-profile', { 'bio': 'Edited' }, 50).status_code == 200
+    assert get('/profile', 50).json['bio'] == 'Edited'
+
+    assert get('/user-preferences', 50).json['language'] == 'english'
+    assert post('/set-user-preferences', { 'language': 'spanish' }, 50).status_code == 200
+    assert get('/user-preferences', 50).json['language'] == 'spanish'
+
+def test_profiles_are_served_from_the_cache_until_the_generation_changes(get):
+    hits = get('/cache-stats', 0).json['profiles']['hits']
+    assert get('/profile', 51).json['bio'] == 'Bio of user 51'
+    assert get('/profile', 51).json['bio'] == 'Bio of user 51'
+    assert get('/cache-stats', 0).json['profiles']['hits'] == hits + 1
+
+    # a change made by another worker without bumping the generation goes unnoticed...
+    engine = create_engine(f'sqlite:///{os.environ["DB_PATH"]}')
+    with engine.begin() as connection:
+        connection.execute(update(Profiles).where(Profiles.user_id == 52).values(bio='Changed elsewhere'))
+    assert get('/profile', 51).json['bio'] == 'Bio of user 51'
+
+    # ...until it does, as invalidate_user() does
+    with engine.begin() as connection:
+        connection.execute(statements.BUMP_GENERATION, { 'user_id': 52 })
+    engine.dispose()
+    assert get('/profile', 51).json['bio'] == 'Changed elsewhere'
+
+def test_snapshot_is_built_once_per_invalidation():
+    snapshot, builds = Snapshot('test_snapshot'), []
+    def build():
+        builds.append(None)
+        return f'value {len(builds)}'
+
+    assert snapshot.get(build) == snapshot.get(build) == 'value 1'
+    snapshot.invalidate()
+    assert snapshot.get(build) == 'value 2'
+    assert snapshot.stats()['builds'] == 2
+
+def test_job_postings_etag(get, post):
+    response = get('/job-postings')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and 12 in [posting['id'] for posting in response.json]
+    assert get('/job-postings', headers={ 'If-None-Match': etag }).status_code == 304
+
+    # user55 posted job 12
+    assert post('/delete-job', { 'job_id': 12 }, 55).status_code == 200
+    response = get('/job-postings', headers={ 'If-None-Match': etag })
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert 12 not in [posting['id'] for posting in response.json]
@@ -0,0 +1,39 @@
+def discover_all(post, i, limit):
+    pages, cursor = [], '0.0'
+    while cursor is not None:
+        response = post('/discover', { 'limit': limit, 'cursor': cursor }, i)
+        assert response.status_code == 200
+        pages.append(response.json['users'])
+        cursor = response.json['cursor']
+    return pages
+
+def test_pages_add_up_to_a_single_page(post):
+    whole = post('/discover', { 'limit': 100 }, 30).json
+    pages = discover_all(post, 30, 7)
+
+    assert whole['cursor'] is None
+    assert all(len(page) <= 7 for page in pages)
+    assert [user for page in pages for user in page] == whole['users']
+
+def test_excludes_self_and_related_users(post):
+    # user30 is connected to user29 and user31, and has requests pending with user28 and user32
+    usernames = [user['username'] for user in post('/discover', { 'limit': 100 }, 30).json['users']]
+
+    assert len(usernames) == len(set(usernames))
+    assert len(usernames) > 0 and set(usernames).isdisjoint(f'user{i}' for i in range(28, 33))
+
+def test_ranks_shared_university_and_major_first(post, get):
+    profile = get('/profile', 30).json
+    users = post('/discover', { 'limit': 100 }, 30).json['users']
+
+    # the cohorts come in order, and each user only in the first one they belong to
+    cohorts = [['university', 'major'], ['university'], ['major']]
+    ranks = [cohorts.index(user['shared']) for user in users]
+    assert ranks == sorted(ranks)
+    for user in users:
+        shared = [label for label in ['university', 'major'] if user[label] == profile[label]]
+        assert user['shared'] == shared
+
+def test_rejects_invalid_requests(post):
+    for body in [{ 'limit': 0 }, { 'limit': 101 }, { 'limit': True }, { 'cursor': '3.0' }, { 'cursor': 'x' }, { 'page': 1 }]:
+        assert post('/discover', body, 30).status_code == 400
@@ -0,0 +1,48 @@
+APPLICATION = { 'graduation_date': '05/01/2025', 'ideal_start_date': '06/01/2025', 'cover_letter': 'Cover letter' }
+
+def applicants_of(post, i, job_id, order, limit):
+    pages, cursor = [], None
+    while True:
+        body = { 'job_id': job_id, 'order': order, 'limit': limit }
+        response = post('/job-applicants', body if cursor is None else { **body, 'cursor': cursor }, i)
+        assert response.status_code == 200
+        pages.append([applicant['username'] for applicant in response.json['applicants']])
+        cursor = response.json['cursor']
+        if cursor is None:
+            return pages
+
+def test_pages_in_both_orders(post):
+    # user0 posted job 1, which user12, user24, user36 and user48 applied to
+    newest = applicants_of(post, 0, 1, 'newest', 1)
+    oldest = applicants_of(post, 0, 1, 'oldest', 3)
+
+    assert [len(page) for page in newest] == [1, 1, 1, 1]
+    assert [len(page) for page in oldest] == [3, 1]
+    assert sorted(sum(newest, [])) == ['user12', 'user24', 'user36', 'user48']
+    assert sum(newest, []) == sum(oldest, [])[::-1]
+
+def test_applicants_come_with_their_experience(post):
+    applicants = post('/job-applicants', { 'job_id': 1 }, 0).json['applicants']
+
+    assert all(applicant['experience'] == [{ 'title': 'Intern', 'employer': 'InCollege', 'start_date': '2022-05-01',
+        'end_date': '2022-08-01' }] for applicant in applicants)
+
+def test_cursor_is_stable_under_new_applications(post):
+    # user45 posted job 10, a new applicant shows up on the last page instead of shifting the others
+    first = post('/job-applicants', { 'job_id': 10, 'order': 'oldest', 'limit': 2 }, 45).json
+    assert post('/apply', { 'job_id': 10, **APPLICATION }, 51).status_code == 200
+    rest = post('/job-applicants', { 'job_id': 10, 'order': 'oldest', 'limit': 100, 'cursor': first['cursor'] }, 45).json
+
+    usernames = [applicant['username'] for applicant in first['applicants'] + rest['applicants']]
+    assert len(usernames) == len(set(usernames))
+    assert usernames[-1] == 'user51' and rest['cursor'] is None
+    assert post('/job-applicants', { 'job_id': 10, 'order': 'newest', 'limit': 1 }, 45).json['applicants'][0]['username'] == 'user51'
+
+def test_only_the_poster_sees_the_applicants(post):
+    assert post('/job-applicants', { 'job_id': 1 }, 1).status_code == 404
+    assert post('/job-applicants', { 'job_id': 1000 }, 0).status_code == 404
+
+def test_rejects_invalid_requests(post):
+    for body in [{}, { 'job_id': 1, 'order': 'best' }, { 'job_id': 1, 'limit': 0 }, { 'job_id': 1, 'cursor': 'x' },
+            { 'job_id': 1, 'cursor': '2024-13-01.1' }, { 'job_id': 1, 'page': 2 }]:
+        assert post('/job-applicants', body, 0).status_code == 400
@@ -0,0 +1,36 @@
+def feed(post, i, **filters):
+    response = post('/my-job-feed', filters, i)
+    assert response.status_code == 200
+    return response.json
+
+def test_flags_the_users_applications_and_marks(post):
+    # user3 applied to job 4 and marked job 5, job 7 is deleted
+    postings = feed(post, 3)
+
+    ids = [posting['id'] for posting in postings]
+    assert ids == sorted(ids) and 7 not in ids
+    assert [posting['id'] for posting in postings if posting['applied']] == [4]
+    assert [posting['id'] for posting in postings if posting['marked']] == [5]
+    assert next(posting for posting in postings if posting['id'] == 4)['username'] == 'user15'
+
+def test_filters(post):
+    postings = feed(post, 3)
+
+    assert feed(post, 3, **{ 'only-unapplied': True }) == [posting for posting in postings if not posting['applied']]
+    assert feed(post, 3, **{ 'only-marked': True }) == [posting for posting in postings if posting['marked']]
+    assert [posting['id'] for posting in feed(post, 3, **{ 'only-unapplied': True, 'only-marked': True })] == [5]
+    assert feed(post, 3, **{ 'only-unapplied': False, 'only-marked': False }) == postings
+
+def test_follows_applications_and_marks(post):
+    # user4 applied to job 5 and marked job 6
+    assert post('/apply', { 'job_id': 8, 'graduation_date': '05/01/2025', 'ideal_start_date': '06/01/2025',
+        'cover_letter': 'Cover letter' }, 4).status_code == 200
+    assert post('/mark', { 'job_id': 3 }, 4).status_code == 200
+
+    postings = { posting['id']: posting for posting in feed(post, 4) }
+    assert postings[8]['applied'] and postings[3]['marked']
+    assert [posting['id'] for posting in feed(post, 4, **{ 'only-unapplied': True, 'only-marked': True })] == [3, 6]
+
+def test_rejects_invalid_requests(post):
+    for body in [{ 'only-marked': 1 }, { 'only-unapplied': 'yes' }, { 'only-applied': True }]:
+        assert post('/my-job-feed', body, 3).status_code == 400
@@ -0,0 +1,45 @@
+from datetime import date
+
+APPLICATION = { 'graduation_date': '05/01/2025', 'ideal_start_date': '06/01/2025', 'cover_letter': 'Cover letter' }
+
+def stats_of(get, i, job_id):
+    response = get('/jobs-posted/stats', i)
+    assert response.status_code == 200
+    return next(posting for posting in response.json if posting['id'] == job_id)
+
+def test_counters_match_the_seeded_rows(get):
+    # user5 posted job 2, which user1, user13, user25, user37 and user49 applied to today and
+    # user0, user12, user24, user36 and user48 marked
+    stats = stats_of(get, 5, 2)
+
+    assert stats['applications'] == 5
+    assert stats['daily'] == [{ 'day': str(date.today()), 'applications': 5 }]
+    assert stats['marks'] == 5
+
+def test_applying_and_marking_update_the_counters(get, post):
+    before = stats_of(get, 5, 2)
+
+    assert post('/apply', { 'job_id': 2, **APPLICATION }, 40).status_code == 200
+    assert post('/mark', { 'job_id': 2 }, 40).status_code == 200
+    after = stats_of(get, 5, 2)
+    assert after['applications'] == before['applications'] + 1
+    assert after['daily'][-1]['applications'] == before['daily'][-1]['applications'] + 1
+    assert after['marks'] == before['marks'] + 1
+
+    assert post('/unmark', { 'job_id': 2 }, 40).status_code == 200
+    assert stats_of(get, 5, 2)['marks'] == before['marks']
+
+def test_rejected_requests_leave_the_counters_alone(get, post):
+    # user20 posted job 5
+    before = stats_of(get, 20, 5), stats_of(get, 10, 3)
+
+    # user16 already applied to job 5, user10 posted job 3, and user10 hasn't marked job 3
+    assert post('/apply', { 'job_id': 5, **APPLICATION }, 16).status_code == 400
+    assert post('/apply', { 'job_id': 3, **APPLICATION }, 10).status_code == 404
+    assert post('/unmark', { 'job_id': 3 }, 10).status_code == 404
+    assert (stats_of(get, 20, 5), stats_of(get, 10, 3)) == before
+
+def test_only_lists_the_posters_live_jobs(get):
+    # user30 only posted job 7, which is deleted
+    assert get('/jobs-posted/stats', 30).json == []
+    assert [posting['id'] for posting in get('/jobs-posted/stats', 0).json] == [1]
@@ -0,0 +1,39 @@
+import hashlib
+from datetime import date
+from workload import PASSWORD
+
+PASSWORD_HASH = hashlib.sha256(PASSWORD.encode()).hexdigest()
+
+def test_bootstrap_matches_the_first_screens_routes(post, get):
+    response = post('/login', { 'username': 'user20', 'passwordHash': PASSWORD_HASH, 'bootstrap': True })
+    assert response.status_code == 200
+    bootstrap = response.json['bootstrap']
+
+    assert bootstrap['profile'] == get('/profile', 20).json
+    assert bootstrap['preferences'] == get('/user-preferences', 20).json
+    assert bootstrap['tier'] == bootstrap['profile']['tier'] == 'standard'
+    assert bootstrap['pending_requests'] == len(get('/pending-requests', 20).json) == 1
+    assert bootstrap['unread_messages'] == sum(conversation['num_unread'] for conversation in get('/unread-messages', 20).json) > 0
+    assert bootstrap['last_application_date'] == str(date.today())
+    # other tests' sign-ups and postings notify everyone too
+    assert { 'content': 'Welcome to InCollege.' } in bootstrap['notifications']
+
+def test_bootstrap_consumes_the_notifications(post):
+    first = post('/login', { 'username': 'user21', 'passwordHash': PASSWORD_HASH, 'bootstrap': True }).json['bootstrap']
+    second = post('/login', { 'username': 'user21', 'passwordHash': PASSWORD_HASH, 'bootstrap': True }).json['bootstrap']
+
+    assert { 'content': 'Welcome to InCollege.' } in first['notifications']
+    assert second['notifications'] == []
+    assert post('/notifications', { 'menu': 'main' }, 21).json == []
+
+def test_bootstrap_is_opt_in(post, get):
+    response = post('/login', { 'username': 'user22', 'passwordHash': PASSWORD_HASH })
+
+    assert list(response.json.keys()) == ['token']
+    assert get('/profile', headers={ 'Authorization': f'Bearer {response.json["token"]}' }).status_code == 200
+    assert { 'content': 'Welcome to InCollege.' } in post('/notifications', { 'menu': 'main' }, 22).json
+
+def test_rejects_invalid_logins(post):
+    assert post('/login', { 'username': 'user23', 'passwordHash': PASSWORD_HASH, 'bootstrap': 'yes' }).status_code == 400
+    assert post('/login', { 'username': 'user23', 'passwordHash': 'wrong', 'bootstrap': True }).status_code == 400
+    assert post('/login', { 'username': 'nobody', 'passwordHash': PASSWORD_HASH, 'bootstrap': True }).status_code == 400
@@ -0,0 +1,8 @@
+def test_matches_case_insensitively(post):
+    matches = post('/lookup-user', { 'firstname': 'first3', 'lastname': 'LAST3' }).json['matches']
+
+    assert matches == [{ 'username': 'user3', 'firstname': 'First3', 'lastname': 'Last3' }]
+
+def test_rejects_invalid_requests(post):
+    for body in [{ 'firstname': 5 }, { 'university': None }, { 'major': ['Mathematics'] }, { 'username': 'user3' }]:
+        assert post('/lookup-user', body).status_code == 400
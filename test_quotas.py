@@ -0,0 +1,34 @@
+JOB = { 'title': 'Quota', 'description': 'Description', 'employer': 'Employer', 'location': 'Tampa', 'salary': 1 }
+USER = { 'firstname': 'New', 'lastname': 'User', 'passwordHash': 'x', 'tier': 'standard', 'university': 'usf', 'major': 'math' }
+
+def test_deleted_job_postings_release_their_slot(server, monkeypatch, post, get):
+    # the seeded deleted postings don't count either
+    live = len(get('/job-postings').json)
+    monkeypatch.setitem(server.app.config, 'JOB_POSTING_LIMIT', live + 1)
+
+    assert post('/post-job', JOB, 1).status_code == 200
+    response = post('/post-job', JOB, 1)
+    assert response.status_code == 400 and response.json['error'] == f'Limit of {live + 1} job postings has been reached'
+
+    # user1 didn't post any of the seeded jobs, deleting twice only releases once
+    job_id, = [posting['id'] for posting in get('/jobs-posted/stats', 1).json]
+    assert post('/delete-job', { 'job_id': job_id }, 1).status_code == 200
+    assert post('/delete-job', { 'job_id': job_id }, 1).status_code == 200
+    assert post('/post-job', JOB, 1).status_code == 200
+    assert post('/post-job', JOB, 1).status_code == 400
+
+def test_rejected_inserts_leave_the_counter_alone(server, monkeypatch, post, get):
+    users = len(get('/list-users').json)
+    monkeypatch.setitem(server.app.config, 'USER_LIMIT', users + 1)
+
+    # the duplicate's transaction rolls back along with the slot it took
+    assert post('/add-user', { **USER, 'username': 'user0' }).json['error'] == 'The username you chose has already been taken.'
+    assert post('/add-user', { **USER, 'username': 'quota0' }).status_code == 200
+    assert post('/add-user', { **USER, 'username': 'quota1' }).status_code == 400
+
+def test_limit_message_of_one(server, monkeypatch, post):
+    # user42 has one job history entry
+    monkeypatch.setitem(server.app.config, 'JOB_HISTORY_LIMIT', 1)
+
+    response = post('/add-job-history', { 'title': 'Intern', 'employer': 'InCollege', 'start_date': '05/01/2023', 'end_date': '08/01/2023' }, 42)
+    assert response.status_code == 400 and response.json['error'] == 'Limit of one job has been reached'
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy.orm import Session
+import caches
+from recommendations import PostingIndex
+
+JOB = { 'description': 'Description', 'employer': 'Employer', 'location': 'Tampa', 'salary': 1 }
+
+@pytest.fixture
+def index(monkeypatch):
+    # an index of its own, leaving the one of the app registered
+    monkeypatch.setitem(caches.registry, 'recommendations', caches.registry['recommendations'])
+    monkeypatch.setitem(caches.tables, 'job_postings', list(caches.tables['job_postings']))
+    return PostingIndex()
+
+def refresh(server, index):
+    with Session(server.engine) as session:
+        index.refresh(session.connection())
+
+def post_jobs(post, get, i, titles):
+    before = { posting['id'] for posting in get('/jobs-posted/stats', i).json }
+    for title in titles:
+        assert post('/post-job', { **JOB, 'title': title }, i).status_code == 200
+    return sorted({ posting['id'] for posting in get('/jobs-posted/stats', i).json } - before)
+
+def test_recommends_postings_matching_the_profile(post, get):
+    # user2 posted none of the seeded jobs
+    major = get('/profile', 8).json['major']
+    job_id, = post_jobs(post, get, 2, [f'{major} Analyst'])
+
+    recommended = post('/recommended-jobs', { 'k': 3 }, 8).json
+    assert recommended[0]['id'] == job_id and recommended[0]['score'] > 0
+    assert all(posting['id'] != job_id for posting in post('/recommended-jobs', { 'k': 100 }, 2).json)
+
+    assert post('/delete-job', { 'job_id': job_id }, 2).status_code == 200
+    assert all(posting['id'] != job_id for posting in post('/recommended-jobs', { 'k': 100 }, 8).json)
+
+def test_refresh_appends_postings_and_applies_deletions(server, index, post, get):
+    refresh(server, index)
+    loaded, slots = set(index.slots), len(index.job_ids)
+    assert 7 not in loaded
+
+    job_id, = post_jobs(post, get, 2, ['Actuary'])
+    refresh(server, index)
+    assert set(index.slots) == loaded | {job_id} and len(index.job_ids) == slots + 1
+
+    max_deletion = index.max_deletion
+    assert post('/delete-job', { 'job_id': job_id }, 2).status_code == 200
+    refresh(server, index)
+    assert set(index.slots) == loaded and len(index.job_ids) == slots + 1
+    assert index.max_deletion > max_deletion
+
+    # a refresh with nothing new changes nothing
+    refresh(server, index)
+    assert set(index.slots) == loaded and len(index.job_ids) == slots + 1 and index.refreshes == 4
+
+def test_deleted_postings_are_compacted_away(server, index, post, get):
+    refresh(server, index)
+    entries = index.entries
+
+    job_ids = post_jobs(post, get, 2, [f'Zymurgist{j} Xylographer{j} Vexillologist{j} Ufologist{j}' for j in range(4)])
+    refresh(server, index)
+    for job_id in job_ids:
+        assert post('/delete-job', { 'job_id': job_id }, 2).status_code == 200
+    refresh(server, index)
+
+    assert index.dead_entries == 0 and index.entries == entries
+    alive = { index.slots[job_id] for job_id in index.slots }
+    assert all(slot in alive for rows in index.rows for slot in rows)
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import select, update
+from models import Notifications, Profiles
+
+def bio(server, user_id):
+    with server.engine.connect() as connection:
+        return connection.execute(select(Profiles.bio).where(Profiles.user_id == user_id)).scalar()
+
+def test_session_is_only_opened_when_used(server):
+    session = server.LazySession(server.Session, read_only=True)
+    session.close()
+    assert session._session is None
+
+    session.connection()
+    assert session._session is not None
+    session.close()
+    assert session._session is None
+
+def test_read_only_sessions_reject_writes(server):
+    with server.app.test_request_context('/profile', method='GET'):
+        session = server.LazySession(server.Session, read_only=True)
+        session.add(Notifications(user_id=34, menu='main', content='Written by a GET'))
+        with pytest.raises(Exception, match='read-only request GET /profile'):
+            session.flush()
+        session.close()
+
+    with server.engine.connect() as connection:
+        assert connection.execute(select(Notifications).where(Notifications.content == 'Written by a GET')).all() == []
+
+def test_read_only_sessions_roll_back(server):
+    # statements bypass the flush, closing the session still discards them
+    session = server.LazySession(server.Session, read_only=True)
+    session.connection().execute(update(Profiles).where(Profiles.user_id == 34).values(bio='Written by a GET'))
+    session.close()
+
+    assert bio(server, 34) == 'Bio of user 33'
+
+def test_read_write_get_routes_commit(get):
+    # user6 applied to job 7, which is deleted
+    assert get('/expired-applications', 6).json == [{ 'job_id': 7, 'title': 'Job 6' }]
+    assert get('/expired-applications', 6).json == []
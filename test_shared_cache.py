@@ -0,0 +1,30 @@
+import os
+import pytest
+import shared_cache
+from shared_cache import SharedCache
+
+def test_values_round_trip_through_json(tmp_path):
+    cache = SharedCache('test_json', 10, path=str(tmp_path / 'cache'))
+    cache.put('alice', (1, 'standard'))
+    cache.put(2, { 'bio': 'Bio', 'years_attended': 3 }, version=1)
+
+    assert cache.get('alice') == [1, 'standard']
+    assert cache.get(2, 1) == { 'bio': 'Bio', 'years_attended': 3 }
+    assert cache.stats()['errors'] == 0
+
+def test_default_path_is_private():
+    directory = os.path.dirname(shared_cache.default_path('users.db'))
+
+    assert os.stat(directory).st_uid == os.getuid()
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+@pytest.mark.skipif(os.getuid() != 0, reason='needs root to give the file away')
+def test_refuses_files_of_other_users(tmp_path):
+    path = tmp_path / 'cache'
+    path.write_bytes(b'')
+    os.chown(path, 12345, 12345)
+
+    with pytest.raises(PermissionError):
+        SharedCache('test_owner', 10, path=str(path))
+    with pytest.raises(PermissionError):
+        shared_cache.remove(str(path))
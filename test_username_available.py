@@ -0,0 +1,69 @@
+import time
+from threading import Event, Thread
+from sqlalchemy.orm import Session
+import caches
+from caches import BloomFilter, UsernameFilter
+from conftest import NUM_USERS
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom_filter = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom_filter.add(f'user{i}')
+
+    assert bloom_filter.count == 1000
+    assert all(f'user{i}' in bloom_filter for i in range(1000))
+    # the error rate holds up to capacity, give or take
+    assert sum(f'free{i}' in bloom_filter for i in range(10000)) < 200
+
+class SlowConnection:
+    # holds up the first load until the test says so
+    def __init__(self, connection, loading, resume):
+        self.connection, self.loading, self.resume = connection, loading, resume
+
+    def execute(self, *args):
+        self.loading.set()
+        self.resume.wait(5)
+        time.sleep(0.1)
+        return self.connection.execute(*args)
+
+def test_requests_during_the_first_load_wait_for_it(server, monkeypatch):
+    # a filter of its own, leaving the one of the app registered
+    monkeypatch.setitem(caches.registry, 'username_filter', caches.registry['username_filter'])
+    monkeypatch.setitem(caches.tables, 'users', list(caches.tables['users']))
+    username_filter = UsernameFilter(0.01)
+    loading, resume, results = Event(), Event(), []
+
+    def first_load():
+        with Session(server.engine) as session:
+            username_filter.refresh(SlowConnection(session.connection(), loading, resume))
+    thread = Thread(target=first_load)
+    thread.start()
+    loading.wait(5)
+    resume.set()
+    with Session(server.engine) as session:
+        results.append(username_filter.available(session, 'user0'))
+        results.append(username_filter.available(session, 'free0'))
+    thread.join()
+
+    assert results == [False, True]
+    assert username_filter.stats()['size'] >= NUM_USERS
+
+def test_taken_and_free_usernames(post):
+    for i in range(NUM_USERS):
+        assert post('/username-available', { 'username': f'user{i}' }).json == { 'available': False }
+    for i in range(100):
+        assert post('/username-available', { 'username': f'free{i}' }).json == { 'available': True }
+
+def test_signed_up_usernames_are_taken(post, get):
+    assert post('/username-available', { 'username': 'newcomer' }).json == { 'available': True }
+    size = get('/cache-stats', 0).json['username_filter']['size']
+
+    assert post('/add-user', { 'username': 'newcomer', 'firstname': 'New', 'lastname': 'Comer', 'passwordHash': 'x',
+        'tier': 'standard', 'university': 'usf', 'major': 'math' }).status_code == 200
+    assert post('/username-available', { 'username': 'newcomer' }).json == { 'available': False }
+    # extended with the new user rather than rebuilt
+    assert get('/cache-stats', 0).json['username_filter']['size'] == size + 1
+
+def test_rejects_invalid_requests(post):
+    for body in [{}, { 'username': 1 }, { 'username': None }, { 'username': ['user0'] }, { 'username': 'user0', 'tier': 'plus' }]:
+        assert post('/username-available', body).status_code == 400
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import random
+import threading
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+# Per-request traces, to break a slow request down into where its time went. Every request carries
+# an id in the X-Request-ID header: main.py sends a new one with each request, the server makes one
+# up for clients that don't, and echoes it in the response. A sampled request is split into spans:
+# authenticate, session begin, every SQL statement, jsonify and the request as a whole. Its spans
+# are appended to a file in the Chrome trace event format, which chrome://tracing and
+# https://ui.perfetto.dev open as a timeline.
+#
+# main.py appends its own spans to the file in TRACE_PATH if set: one per screen and one per request
+# with the client-side timing, tagged with the same request id. It also sends X-Trace: 1, which makes
+# the server trace the request regardless of sampling, so a server writing to the same file yields
+# one timeline from the key press down to the SQL statements. Timestamps are wall clock
+# microseconds so the spans of the client and the server line up.
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TRACE_HEADER = 'X-Trace'
+
+# ids are echoed and written to the trace file, so only accept short tokens
+REQUEST_ID = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+class Trace:
+    '''
+    The spans of one request as complete ('X') events of the Chrome trace event format.
+    '''
+
+    def __init__(self, request_id, category):
+        self.request_id = request_id
+        self.category = category
+        self.pid = os.getpid()
+        self.events = []
+        # the wall clock places the trace, perf_counter times its spans
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+
+    def add(self, name, start, end, **args):
+        if self.request_id is not None:
+            args['request_id'] = self.request_id
+        self.events.append({
+            'name': name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': round((self.wall_start + start - self.start) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': self.pid,
+            'tid': threading.get_native_id(),
+            'args': args
+        })
+
+    @contextmanager
+    def span(self, name, **args):
+        # yields the span's args, to which the caller can add what it learns meanwhile
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.perf_counter(), **args)
+
+    def write(self, path):
+        # The JSON array format doesn't require the closing bracket, so every process can append its
+        # events to the same file. The lock keeps the writes of concurrent workers whole.
+        data = ''.join(json.dumps(event) + ',\n' for event in self.events)
+        with open(path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # the size as of taking the lock, another process may have written the bracket meanwhile
+            if os.fstat(f.fileno()).st_size == 0:
+                f.write('[\n')
+            f.write(data)
+
+@contextmanager
+def record(path, name, request_id=None, category='client', **args):
+    # a single span appended to path once it ends, e.g. the client-side timing of a request
+    trace = Trace(request_id, category)
+    try:
+        with trace.span(name, **args) as span_args:
+            yield span_args
+    finally:
+        trace.write(path)
+
+@contextmanager
+def span(name, **args):
+    # a span of the current request, if it is traced
+    trace = g.get('trace') if has_request_context() else None
+    if trace is None:
+        yield args
+        return
+
+    with trace.span(name, **args) as span_args:
+        yield span_args
+
+def traced(name, function):
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+class TracedJSONProvider(DefaultJSONProvider):
+    # jsonify() and handlers returning a dict or list both serialize through response()
+    def response(self, *args, **kwargs):
+        with span('jsonify'):
+            return super().response(*args, **kwargs)
+
+class Tracer:
+    '''
+    Assigns request ids and traces a sample of the requests, see the top of this module.
+
+    Configuration is read from app.config:
+        TRACE_PATH          file the traces are appended to (default None, no request is traced)
+        TRACE_SAMPLE_RATE   fraction of the requests traced (default 0.01), requests sent with
+                            X-Trace: 1 always are
+    '''
+
+    def __init__(self, app=None, engine=None):
+        if app is not None:
+            self.install(app, engine)
+
+    def install(self, app, engine=None):
+        self.app = app
+        app.config.setdefault('TRACE_PATH', None)
+        app.config.setdefault('TRACE_SAMPLE_RATE', 0.01)
+        app.json = TracedJSONProvider(app)
+
+        if engine is not None:
+            self.attach(engine)
+
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.write_trace)
+
+    def attach(self, engine):
+        # separate from install so engines created after fork (see gunicorn_config.py) can be hooked up
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def start_request(self):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = request_id if REQUEST_ID.fullmatch(request_id) else new_request_id()
+
+        path = self.app.config['TRACE_PATH']
+        if path is not None and (request.headers.get(TRACE_HEADER) == '1' or random.random() < self.app.config['TRACE_SAMPLE_RATE']):
+            g.trace = Trace(g.request_id, 'server')
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'trace' in g:
+            conn.info.setdefault('trace_start_time', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'trace' in g:
+            # parameters are left out, they may hold password hashes and message contents
+            end = time.perf_counter()
+            args = { 'statement': statement }
+            if cursor.rowcount >= 0:
+                args['rows'] = cursor.rowcount      # -1 for SELECT on SQLite
+            g.trace.add('sql ' + statement.split(None, 1)[0].lower(), conn.info['trace_start_time'].pop(), end, **args)
+
+    def finish_request(self, response):
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        if 'trace' in g:
+            # lets the client tell the time spent in the server from the time spent on the network
+            response.headers['Server-Timing'] = f'app;dur={(time.perf_counter() - g.trace.start) * 1000:.1f}'
+            g.trace_status = response.status_code
+        return response
+
+    def write_trace(self, exception):
+        # teardown functions run after the blueprint ones, which close the session
+        trace = g.pop('trace', None)
+        if trace is None:
+            return
+
+        trace.add(f'{request.method} {request.path}', trace.start, time.perf_counter(),
+            endpoint=request.endpoint, status=g.pop('trace_status', 500))
+        try:
+            trace.write(self.app.config['TRACE_PATH'])
+        except OSError as e:
+            self.app.logger.warning('could not write the trace of %s: %s', g.request_id, e)
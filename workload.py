@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import random
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import jwt
+import quotas
+import job_stats
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models import search_key, Base, Users, Profiles, Experience, Connections, JobPostings, JobApplications, JobsMarked, UserPreferences, Conversations, Messages, Notifications
+
+# Shared by the local tooling (explain_audit.py, benchmark.py): builds a seeded database, loads
+# server.py against it and describes one representative request for every route.
+
+PASSWORD = 'Password1!'
+
+def create_database(db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    Base.metadata.create_all(engine)
+    return engine
+
+def seed(db_path, num_users=100, random_seed=0):
+    # user i has the username user{i} and id i + 1, is connected to user i + 1,
+    # has a pending request from user i + 2 and a conversation with user i + 1
+    rng = random.Random(random_seed)
+    engine = create_database(db_path)
+    password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    num_jobs = max(num_users // 5, 1)
+
+    with Session(engine) as session:
+        session.add_all(Users(id=i + 1, username=f'user{i}', firstname=f'First{i}', lastname=f'Last{i}',
+            passwordHash=password_hash, tier='plus' if i % 2 else 'standard') for i in range(num_users))
+        for i in range(num_users):
+            university = rng.choice(['University Of South Florida', 'Florida State University'])
+            major = rng.choice(['Computer Science', 'Data Science', 'Mathematics'])
+            session.add(Profiles(user_id=i + 1, bio=f'Bio of user {i}', university=university, major=major, years_attended=rng.randint(1, 4),
+                firstname_key=search_key(f'First{i}'), lastname_key=search_key(f'Last{i}'), university_key=search_key(university), major_key=search_key(major)))
+        session.add_all(UserPreferences(user_id=i + 1, email_notifications_enabled=True, sms_notifications_enabled=True,
+            targeted_advertising_enabled=True, language='english') for i in range(num_users))
+        session.add_all(Experience(user_id=i + 1, title='Intern', employer='InCollege', start_date=date(2022, 5, 1),
+            end_date=date(2022, 8, 1)) for i in range(num_users))
+
+        for i in range(num_users):
+            if i + 1 < num_users:
+                session.add(Connections(user_id=i + 1, connection_id=i + 2, request_status='accepted'))
+                session.add(Conversations(id=i + 1, user1=i + 1, user2=i + 2))
+                session.add_all(Messages(sender=i + 1 + (j % 2), conversation=i + 1, time=datetime(2023, 1, 1) + timedelta(minutes=j),
+                    read=j < 3, content=f'message {j}') for j in range(5))
+            if i + 2 < num_users:
+                session.add(Connections(user_id=i + 3, connection_id=i + 1, request_status='pending'))
+            session.add(Notifications(user_id=i + 1, menu='main', content='Welcome to InCollege.'))
+
+        session.add_all(JobPostings(id=j + 1, user_id=(j * 5) % num_users + 1, title=f'Job {j}', description='Description',
+            employer='Employer', location='Tampa', salary=50000 + j, deleted=j % 7 == 6) for j in range(num_jobs))
+        for i in range(num_users):
+            job_id = i % num_jobs + 1
+            if (job_id - 1) * 5 % num_users != i:
+                session.add(JobApplications(user_id=i + 1, job_id=job_id, graduation_date=date(2025, 5, 1),
+                    ideal_start_date=date(2025, 6, 1), cover_letter='Cover letter', application_date=date.today()))
+            session.add(JobsMarked(user_id=i + 1, job_id=(i + 1) % num_jobs + 1))
+
+        session.commit()
+
+    with engine.begin() as connection:
+        job_stats.rebuild(connection)
+
+    engine.dispose()
+    return num_users, num_jobs
+
+def load_app(db_path):
+    # server.py reads DB_PATH and the quota limits at import time, seeded databases are past the default limits
+    os.environ['DB_PATH'] = db_path
+    for config_key, _, _, _ in quotas.QUOTAS.values():
+        os.environ.setdefault(config_key, 'unlimited')
+    import server
+    return server
+
+def auth_header(user_id, username):
+    payload = { 'user_id': user_id, 'username': username, 'exp': time.time() + 24 * 60 * 60 }
+    token = jwt.encode(payload, Path('./jwt-key.txt').read_text().strip(), algorithm='HS256')
+    return { 'Authorization': f'Bearer {token}' }
+
+# endpoint -> requests undoing a scenario that would fail if repeated as is, e.g. marking a job
+# already marked, as (path, body, user) with user the acting user's index or None for the
+# scenario's own. Sent after each request of the scenario, see undo().
+UNDO = {
+    'authenticated_handlers.mark': [('/unmark', lambda i: { 'job_id': 1 }, None)],
+    'authenticated_handlers.unmark': [('/mark', lambda i: { 'job_id': 2 }, None)],
+    # user0 asks user1 to connect again, and user1 accepts
+    'authenticated_handlers.disconnect': [('/make-connection-request', lambda i: { 'username': 'user1' }, None),
+        ('/accept-requests', lambda i: { 'users-to-accept': [{ 'username': 'user0' }] }, 1)],
+    'authenticated_handlers.delete_conversation': [('/start-conversation', lambda i: { 'username': 'user1', 'content': 'hello' }, None)],
+}
+
+def undo(client, endpoint, headers, i):
+    for path, body, user in UNDO.get(endpoint, []):
+        step_headers = headers if user is None else auth_header(user + 1, f'user{user}')
+        response = client.post(path, data=json.dumps(body(i)), content_type='application/json', headers=step_headers)
+        assert response.status_code == 200, f'Undoing {endpoint} with {path} failed with status {response.status_code}'
+
+def unexpected_statuses(statuses):
+    # every scenario is meant to succeed, anything else means the run measured a rejection or a failure
+    return sorted(status for status in statuses if not 200 <= status < 300)
+
+def scenarios(num_users, num_jobs):
+    '''
+    Returns (endpoint, method, path, body, user) tuples, one per route. body is a function of the
+    iteration number so that repeated runs of write routes don't collide, with the help of UNDO for
+    the routes whose requests can't all differ; user is the index of the
+    acting user, or None for unauthenticated routes. Every scenario acts as user0 unless it has to
+    act on someone else's data.
+    '''
+
+    job = lambda i: i % num_jobs + 1
+    return [
+        ('handlers.list_users', 'GET', '/list-users', None, None),
+        ('handlers.lookup_user', 'POST', '/lookup-user', lambda i: { 'university': 'University Of South Florida', 'major': 'Data Science' }, None),
+        ('handlers.log_in', 'POST', '/login', lambda i: { 'username': 'user0', 'passwordHash': hashlib.sha256(PASSWORD.encode()).hexdigest(),
+            'bootstrap': i % 2 == 0 }, None),
+        ('handlers.username_available', 'POST', '/username-available', lambda i: { 'username': f'user{i % num_users}' if i % 2 else f'free{i}' }, None),
+        ('handlers.add_user', 'POST', '/add-user', lambda i: { 'username': f'new{i}', 'firstname': 'New', 'lastname': 'User',
+            'passwordHash': 'x', 'tier': 'standard', 'university': 'usf', 'major': 'math' }, None),
+        ('handlers.get_job_postings', 'GET', '/job-postings', None, None),
+        ('authenticated_handlers.my_job_feed', 'POST', '/my-job-feed', lambda i: { 'only-unapplied': i % 2 == 0 }, 0),
+        ('authenticated_handlers.discover', 'POST', '/discover', lambda i: { 'cursor': f'{i % 3}.{i % num_users}' }, 0),
+        ('authenticated_handlers.get_profile', 'GET', '/profile', None, 0),
+        ('authenticated_handlers.get_friend_profile', 'POST', '/friend-profile', lambda i: { 'id': 2 }, 0),
+        ('authenticated_handlers.edit_profile', 'POST', '/edit-profile', lambda i: { 'bio': f'Bio {i}' }, 0),
+        ('authenticated_handlers.get_job_history', 'GET', '/job-history', None, 0),
+        ('authenticated_handlers.add_job_history', 'POST', '/add-job-history', lambda i: { 'title': 'Tutor', 'employer': 'USF',
+            'start_date': '01/01/2021', 'end_date': '01/01/2022' }, 0),
+        ('authenticated_handlers.edit_job_history', 'POST', '/edit-job-history', lambda i: { 'id': 1, 'title': f'Intern {i}' }, 0),
+        ('authenticated_handlers.remove_job_history', 'POST', '/remove-job-history', lambda i: { 'id': num_users + i + 1 }, 0),
+        ('authenticated_handlers.make_connection_request', 'POST', '/make-connection-request', lambda i: { 'username': f'user{i % (num_users - 3) + 3}' }, 0),
+        ('authenticated_handlers.pending_requests', 'GET', '/pending-requests', None, 0),
+        ('authenticated_handlers.accept_requests', 'POST', '/accept-requests', lambda i: { 'users-to-accept': [{ 'username': 'user2' }],
+            'users-to-deny': [{ 'username': f'user{i % num_users}' }] }, 0),
+        ('authenticated_handlers.connections', 'GET', '/connections', None, 0),
+        ('authenticated_handlers.disconnect', 'POST', '/disconnect', lambda i: { 'username': 'user1' }, 0),
+        ('authenticated_handlers.post_job', 'POST', '/post-job', lambda i: { 'title': f'Posted {i}', 'description': 'Description',
+            'employer': 'Employer', 'location': 'Tampa', 'salary': 60000 }, 0),
+        ('authenticated_handlers.recommended_jobs', 'POST', '/recommended-jobs', lambda i: { 'k': 10 }, 0),
+        ('authenticated_handlers.get_jobs_posted', 'GET', '/jobs-posted', None, 0),
+        ('authenticated_handlers.get_jobs_posted_stats', 'GET', '/jobs-posted/stats', None, 0),
+        ('authenticated_handlers.job_applicants', 'POST', '/job-applicants', lambda i: { 'job_id': 1, 'limit': 5,
+            'order': 'oldest' if i % 2 else 'newest' }, 0),
+        ('authenticated_handlers.delete_job', 'POST', '/delete-job', lambda i: { 'job_id': 1 }, 0),
+        ('authenticated_handlers.get_user_preferences', 'GET', '/user-preferences', None, 0),
+        ('authenticated_handlers.set_user_preferences', 'POST', '/set-user-preferences', lambda i: { 'language': 'english' }, 0),
+        ('authenticated_handlers.apply', 'POST', '/apply', lambda i: { 'job_id': job(i + 1), 'graduation_date': '05/01/2025',
+            'ideal_start_date': '06/01/2025', 'cover_letter': 'Cover letter' }, 0),
+        ('authenticated_handlers.applications', 'GET', '/applications', None, 0),
+        ('authenticated_handlers.expired_applications', 'GET', '/expired-applications', None, 0),
+        # user0 has job 2 marked and not job 1, see seed() and UNDO
+        ('authenticated_handlers.mark', 'POST', '/mark', lambda i: { 'job_id': 1 }, 0),
+        ('authenticated_handlers.marked', 'GET', '/marked', None, 0),
+        ('authenticated_handlers.unmark', 'POST', '/unmark', lambda i: { 'job_id': 2 }, 0),
+        ('authenticated_handlers.unread_messages', 'GET', '/unread-messages', None, 0),
+        ('authenticated_handlers._messages', 'POST', '/messages', lambda i: { 'username': 'user1' }, 0),
+        ('authenticated_handlers.message', 'POST', '/message', lambda i: { 'username': 'user1', 'content': f'message {i}' }, 0),
+        ('authenticated_handlers.start_conversation', 'POST', '/start-conversation', lambda i: { 'username': f'user{i % (num_users - 3) + 3}',
+            'content': 'hello' }, 1),
+        ('authenticated_handlers.delete_conversation', 'POST', '/delete-conversation', lambda i: { 'username': 'user1' }, 2),
+        ('authenticated_handlers._notifications', 'POST', '/notifications', lambda i: { 'menu': 'main' }, 0),
+    ]